@@ -0,0 +1,362 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+"""
+In-process stand-ins for the Plex, Sonarr and Radarr endpoints Plex Unmonitorr calls.
+
+The synthetic library is described by a handful of numbers and every response is generated on demand
+from them, so a 500k episode library costs little more memory than a 1k one. Each server sleeps for
+its configured latency before answering and counts requests per method and route.
+"""
+
+# Synthetic watch dates go back a year from startup, so `days_back` selects a stable share of the plays
+BASE_TIME = int(time.time())
+DAY = 86_400
+
+TV_SECTION = "1"
+MOVIE_SECTION = "2"
+TV_LIBRARY = "TV Shows"
+MOVIE_LIBRARY = "Movies"
+
+
+@dataclass(frozen=True)
+class SyntheticLibrary:
+    """Shape of the generated Plex/Sonarr/Radarr data; episode `i` belongs to series `i // episodes_per_series`."""
+
+    episodes: int
+    movies: int
+    episodes_per_series: int = 100
+    episodes_per_season: int = 10
+    # Share of episodes and movies that are watched in Plex
+    watched_ratio: float = 0.5
+
+    @property
+    def series(self) -> int:
+        return -(-self.episodes // self.episodes_per_series)
+
+    def is_watched(self, index: int) -> bool:
+        # Multiplicative hash spreads watched items evenly over every series
+        return (index * 2_654_435_761) % 1000 < self.watched_ratio * 1000
+
+    def last_viewed_at(self, index: int) -> int:
+        return BASE_TIME - (index % 365) * DAY
+
+    def series_episodes(self, series_index: int) -> range:
+        start = series_index * self.episodes_per_series
+        return range(start, min(start + self.episodes_per_series, self.episodes))
+
+    def episode_numbers(self, index: int) -> tuple[int, int]:
+        ordinal = index % self.episodes_per_series
+        return ordinal // self.episodes_per_season + 1, ordinal % self.episodes_per_season + 1
+
+
+class MockServer(ThreadingHTTPServer):
+    """HTTP server on an ephemeral local port that routes every request to `handle`."""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.requests: dict[tuple[str, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    def record(self, method: str, route: str) -> None:
+        with self._lock:
+            self.requests[(method, route)] += 1
+
+    def handle(self, method: str, path: str, query: dict[str, str], body: Any) -> tuple[int, Any]:
+        raise NotImplementedError
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40ms to small responses
+    disable_nagle_algorithm = True
+
+    def _dispatch(self, method: str) -> None:
+        server: MockServer = self.server
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        if server.latency:
+            time.sleep(server.latency)
+        status, payload = server.handle(method, url.path, query, body)
+
+        content = json.dumps(payload, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockPlexServer(MockServer):
+    """
+    Serves `/library/sections`, paged (and optionally `lastViewedAt:desc` sorted) `/library/sections/{id}/all`
+    and `/status/sessions/history/all`, and `/library/metadata/{keys}` for one or more comma-separated rating keys.
+    """
+
+    def __init__(self, library: SyntheticLibrary, latency: float = 0.0):
+        super().__init__(latency)
+        self.library = library
+        # Section `updatedAt`, bump it to make the libraries look changed
+        self.updated_at = BASE_TIME
+        # Index lists for each (section, watched_only, viewed_after, sort) filter, built on first use
+        self._listings: dict[tuple[str, bool, int | None, str | None], list[int]] = {}
+
+    def _listing(
+        self, section: str, watched_only: bool, viewed_after: int | None, sort: str | None = None
+    ) -> list[int]:
+        key = (section, watched_only, viewed_after, sort)
+        if key not in self._listings:
+            total = self.library.episodes if section == TV_SECTION else self.library.movies
+            listing = [
+                i
+                for i in range(total)
+                if (not watched_only or self.library.is_watched(i))
+                and (
+                    viewed_after is None
+                    or (self.library.is_watched(i) and self.library.last_viewed_at(i) > viewed_after)
+                )
+            ]
+            if sort == "lastViewedAt:desc":
+                listing.sort(key=self.library.last_viewed_at, reverse=True)
+            self._listings[key] = listing
+        return self._listings[key]
+
+    def episode(self, index: int) -> dict[str, Any]:
+        series_index = index // self.library.episodes_per_series
+        season, episode = self.library.episode_numbers(index)
+        watched = self.library.is_watched(index)
+        tvdb_id = 100_000 + series_index
+        item = {
+            "ratingKey": str(1_000_000 + index),
+            "guid": f"plex://episode/{index:024x}",
+            "type": "episode",
+            "title": f"Episode {episode}",
+            "grandparentTitle": f"Series {series_index}",
+            "parentIndex": season,
+            "index": episode,
+            "Guid": [{"id": f"tvdb://{tvdb_id}{season:02}{episode:03}"}, {"id": f"imdb://tt{index:07}"}],
+            "Media": [
+                {
+                    "Part": [
+                        {
+                            "file": f"/tv/Series {series_index} {{tvdb-{tvdb_id}}}/Season {season:02}/"
+                            f"Series {series_index} - S{season:02}E{episode:02}.mkv"
+                        }
+                    ]
+                }
+            ],
+        }
+        if watched:
+            item["viewCount"] = 1
+            item["lastViewedAt"] = self.library.last_viewed_at(index)
+        return item
+
+    def movie(self, index: int) -> dict[str, Any]:
+        item = {
+            "ratingKey": str(5_000_000 + index),
+            "guid": f"plex://movie/{index:024x}",
+            "type": "movie",
+            "title": f"Movie {index}",
+            "Guid": [{"id": f"tmdb://{500_000 + index}"}, {"id": f"imdb://tt{index:07}"}],
+            "Media": [{"Part": [{"file": f"/movies/Movie {index}/Movie {index}.mkv"}]}],
+        }
+        if self.library.is_watched(index):
+            item["viewCount"] = 1
+            item["lastViewedAt"] = self.library.last_viewed_at(index)
+        return item
+
+    def handle(self, method: str, path: str, query: dict[str, str], body: Any) -> tuple[int, Any]:
+        if path == "/library/sections":
+            self.record(method, path)
+            directories = [
+                {"key": TV_SECTION, "title": TV_LIBRARY, "type": "show", "updatedAt": self.updated_at},
+                {"key": MOVIE_SECTION, "title": MOVIE_LIBRARY, "type": "movie", "updatedAt": self.updated_at},
+            ]
+            return 200, {"MediaContainer": {"size": len(directories), "Directory": directories}}
+
+        if path.startswith("/library/sections/") and path.endswith("/all"):
+            self.record(method, "/library/sections/{id}/all")
+            section = path.split("/")[3]
+            viewed_after = query.get("lastViewedAt>>")
+            listing = self._listing(
+                section, "viewCount>>" in query, int(viewed_after) if viewed_after else None, query.get("sort")
+            )
+            start = int(query.get("X-Plex-Container-Start", 0))
+            size = query.get("X-Plex-Container-Size")
+            indexes = listing[start : start + int(size)] if size else listing[start:]
+            build = self.episode if section == TV_SECTION else self.movie
+            metadata = [build(i) for i in indexes]
+            return 200, {"MediaContainer": {"size": len(metadata), "totalSize": len(listing), "Metadata": metadata}}
+
+        if path == "/status/sessions/history/all":
+            self.record(method, path)
+            section = query.get("librarySectionID", TV_SECTION)
+            viewed_after = query.get("viewedAt>>")
+            # Every watched item has been played once, at its lastViewedAt
+            listing = self._listing(section, True, int(viewed_after) if viewed_after else None)
+            start = int(query.get("X-Plex-Container-Start", 0))
+            size = query.get("X-Plex-Container-Size")
+            indexes = listing[start : start + int(size)] if size else listing[start:]
+            build = self.episode if section == TV_SECTION else self.movie
+            entries = []
+            for i in indexes:
+                item = build(i)
+                entries.append(
+                    {
+                        "ratingKey": item["ratingKey"],
+                        "title": item["title"],
+                        "type": item["type"],
+                        "viewedAt": item["lastViewedAt"],
+                        "librarySectionID": section,
+                        "accountID": 1,
+                    }
+                )
+            return 200, {"MediaContainer": {"size": len(entries), "totalSize": len(listing), "Metadata": entries}}
+
+        if path.startswith("/library/metadata/"):
+            self.record(method, "/library/metadata/{keys}")
+            items = []
+            for rating_key in map(int, path.rsplit("/", 1)[-1].split(",")):
+                items.append(
+                    self.movie(rating_key - 5_000_000)
+                    if rating_key >= 5_000_000
+                    else self.episode(rating_key - 1_000_000)
+                )
+            return 200, {"MediaContainer": {"size": len(items), "Metadata": items}}
+
+        return 404, {"error": "Not found"}
+
+
+class MockSonarrServer(MockServer):
+    """Serves `/api/v3/series`, `/api/v3/episode?seriesId=` and `PUT /api/v3/episode/monitor`."""
+
+    def __init__(self, library: SyntheticLibrary, latency: float = 0.0):
+        super().__init__(latency)
+        self.library = library
+        self.unmonitored: set[int] = set()
+
+    def series(self, series_index: int) -> dict[str, Any]:
+        episodes = self.library.series_episodes(series_index)
+        return {
+            "id": series_index + 1,
+            "title": f"Series {series_index}",
+            "tvdbId": 100_000 + series_index,
+            "monitored": True,
+            "statistics": {"episodeCount": len(episodes), "episodeFileCount": len(episodes)},
+            "previousAiring": "2025-01-01T00:00:00Z",
+        }
+
+    def handle(self, method: str, path: str, query: dict[str, str], body: Any) -> tuple[int, Any]:
+        self.record(method, path)
+        if path == "/api/v3/series" and method == "GET":
+            if tvdb_id := query.get("tvdbId"):
+                series_index = int(tvdb_id) - 100_000
+                return 200, [self.series(series_index)] if 0 <= series_index < self.library.series else []
+            return 200, [self.series(i) for i in range(self.library.series)]
+
+        if path == "/api/v3/episode" and method == "GET":
+            series_index = int(query["seriesId"]) - 1
+            episodes = []
+            for i in self.library.series_episodes(series_index):
+                season, episode = self.library.episode_numbers(i)
+                episodes.append(
+                    {
+                        "id": i + 1,
+                        "seriesId": series_index + 1,
+                        "seasonNumber": season,
+                        "episodeNumber": episode,
+                        "title": f"Episode {episode}",
+                        "hasFile": True,
+                        "monitored": i + 1 not in self.unmonitored,
+                    }
+                )
+            return 200, episodes
+
+        if path == "/api/v3/episode/monitor" and method == "PUT":
+            if body["monitored"]:
+                self.unmonitored.difference_update(body["episodeIds"])
+            else:
+                self.unmonitored.update(body["episodeIds"])
+            return 202, [{"id": episode_id, "monitored": body["monitored"]} for episode_id in body["episodeIds"]]
+
+        return 404, {"error": "Not found"}
+
+
+class MockRadarrServer(MockServer):
+    """Serves `/api/v3/movie` and `PUT /api/v3/movie/editor`."""
+
+    def __init__(self, library: SyntheticLibrary, latency: float = 0.0):
+        super().__init__(latency)
+        self.library = library
+        self.unmonitored: set[int] = set()
+
+    def movie(self, index: int) -> dict[str, Any]:
+        return {
+            "id": index + 1,
+            "title": f"Movie {index}",
+            "tmdbId": 500_000 + index,
+            "hasFile": True,
+            "monitored": index + 1 not in self.unmonitored,
+        }
+
+    def handle(self, method: str, path: str, query: dict[str, str], body: Any) -> tuple[int, Any]:
+        self.record(method, path)
+        if path == "/api/v3/movie" and method == "GET":
+            if tmdb_id := query.get("tmdbId"):
+                index = int(tmdb_id) - 500_000
+                return 200, [self.movie(index)] if 0 <= index < self.library.movies else []
+            return 200, [self.movie(i) for i in range(self.library.movies)]
+
+        if path == "/api/v3/movie/editor" and method == "PUT":
+            if body["monitored"]:
+                self.unmonitored.difference_update(body["movieIds"])
+            else:
+                self.unmonitored.update(body["movieIds"])
+            return 202, {}
+
+        return 404, {"error": "Not found"}
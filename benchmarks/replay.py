@@ -0,0 +1,139 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+from benchmarks.run import print_table
+from plex_unmonitorr.capture import CaptureArchive, replay_session
+from plex_unmonitorr.library_service import collect_watched_from_servers
+from plex_unmonitorr.metrics import metrics
+from plex_unmonitorr.plex_client import PlexClient
+from plex_unmonitorr.process_media import process_media
+from plex_unmonitorr.profiling import Profiler
+from plex_unmonitorr.radarr_client import RadarrClient
+from plex_unmonitorr.sonarr_client import SonarrClient
+
+"""
+Replays a capture recorded with `settings.capture_dir` through the real fetch, match and unmonitor code,
+without any network access, and reports the wall time of each run:
+
+    python -m benchmarks.replay config/captures/20250101-120000.jsonl.gz --repeat 5 --profile
+
+Requests are matched on client, method, path, query and body. Time-based filters (a `days_back` cutoff)
+and bulk update bodies fall back to a looser match, so items watched right at the cutoff may differ from
+the recorded run. Requests the capture has no response for fail, and are counted as misses.
+"""
+
+
+@dataclass
+class ReplayResult:
+    run: int
+    watched: int
+    wall_seconds: float
+    fetch_seconds: float
+    process_seconds: float
+    requests: int
+    misses: int
+
+
+def replay(path: str, args: argparse.Namespace, number: int, profiler: Profiler) -> ReplayResult:
+    # Load the capture for each run, since replaying consumes repeated responses in order
+    archive = CaptureArchive(path)
+    settings = archive.run_info.get("settings", {})
+    dry_run = settings.get("dry_run", True) if args.dry_run is None else args.dry_run
+
+    # Hosts are never recorded, so any URL will do; retries and breakers would only hide misses
+    plex_clients = {}
+    clients = {}
+    for name, client_type in archive.clients.items():
+        url = f"http://{name}.replay"
+        if client_type == "plex":
+            plex_clients[name] = PlexClient(url, "", retries=0)
+        elif client_type == "sonarr":
+            clients[name] = SonarrClient(url, "", retries=0)
+        else:
+            clients[name] = RadarrClient(url, "", retries=0)
+    for name, client in [*plex_clients.items(), *clients.items()]:
+        replay_session(client.session, name, archive)
+
+    metrics.reset()
+    started = time.perf_counter()
+    with profiler.stage(f"fetch-{number}"):
+        watched_media = collect_watched_from_servers(
+            plex_clients,
+            archive.run_info.get("libraries", {}).keys(),
+            settings.get("days_back"),
+            settings.get("page_size"),
+            settings.get("parallel", False),
+            retain_details=settings.get("retain_media_details", True),
+            from_history=settings.get("ingestion") == "history",
+        )
+    fetched = time.perf_counter()
+    with profiler.stage(f"process-{number}"):
+        process_media(
+            archive.run_info.get("libraries", {}),
+            clients,
+            dry_run,
+            watched_media,
+            settings.get("ignored_tmdb_ids", []),
+            settings.get("ignored_tvdb_ids", []),
+            settings.get("parallel", False),
+        )
+    finished = time.perf_counter()
+
+    for client in [*plex_clients.values(), *clients.values()]:
+        client.close()
+
+    return ReplayResult(
+        run=number,
+        watched=sum(len(result.watched) for result in watched_media.values()),
+        wall_seconds=round(finished - started, 3),
+        fetch_seconds=round(fetched - started, 3),
+        process_seconds=round(finished - fetched, 3),
+        requests=sum(metrics.requests.values()),
+        misses=archive.misses,
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay a captured Plex Unmonitorr run offline")
+    parser.add_argument("capture", help="Capture file written with settings.capture_dir")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times to replay the capture")
+    parser.add_argument("--dry-run", action=argparse.BooleanOptionalAction, help="Override the recorded dry_run")
+    parser.add_argument("--profile", action="store_true", help="Profile each run into config/profiles")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    results = []
+    with Profiler(args.profile) as profiler:
+        for number in range(1, args.repeat + 1):
+            print(f"Replaying {args.capture} ({number}/{args.repeat})...", file=sys.stderr)
+            results.append(replay(args.capture, args, number, profiler))
+
+    print_table(
+        results,
+        [
+            ("run", "Run"),
+            ("watched", "Watched"),
+            ("wall_seconds", "Wall (s)"),
+            ("fetch_seconds", "Fetch (s)"),
+            ("process_seconds", "Process (s)"),
+            ("requests", "Requests"),
+            ("misses", "Misses"),
+        ],
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(result) for result in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+from benchmarks.mock_servers import (
+    MOVIE_LIBRARY,
+    TV_LIBRARY,
+    MockPlexServer,
+    MockRadarrServer,
+    MockSonarrServer,
+    SyntheticLibrary,
+)
+from plex_unmonitorr.library_service import get_watched_content
+from plex_unmonitorr.process_media import process_media
+from plex_unmonitorr.radarr_client import DEFAULT_BATCH_SIZE, RadarrClient
+from plex_unmonitorr.sonarr_client import DEFAULT_MAX_WORKERS, SonarrClient
+
+"""
+End-to-end benchmark: runs `get_watched_content` and `process_media` against the stand-in servers in
+`benchmarks.mock_servers` and reports wall time, requests per server and peak Python memory.
+
+    python -m benchmarks.run --episodes 1000 10000 100000 --latency 0.01
+
+Peak memory is measured with tracemalloc, so it also includes the stand-in servers' transient response
+buffers, and it slows allocation-heavy code down noticeably: pass `--no-memory` when comparing wall times.
+"""
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+@dataclass
+class BenchmarkResult:
+    episodes: int
+    movies: int
+    watched: int
+    wall_seconds: float
+    fetch_seconds: float
+    process_seconds: float
+    plex_requests: int
+    sonarr_requests: int
+    radarr_requests: int
+    unmonitored_episodes: int
+    unmonitored_movies: int
+    peak_memory_mb: float | None
+
+
+def run_benchmark(library: SyntheticLibrary, args: argparse.Namespace) -> BenchmarkResult:
+    with (
+        MockPlexServer(library, args.latency) as plex,
+        MockSonarrServer(library, args.latency) as sonarr,
+        MockRadarrServer(library, args.latency) as radarr,
+        SonarrClient(sonarr.url, "benchmark", max_workers=args.max_workers) as sonarr_client,
+        RadarrClient(radarr.url, "benchmark", batch_size=args.batch_size) as radarr_client,
+    ):
+        if args.memory:
+            tracemalloc.start()
+
+        started = time.perf_counter()
+        watched_media = get_watched_content(
+            plex.url,
+            "benchmark",
+            [TV_LIBRARY, MOVIE_LIBRARY],
+            days_back=args.days_back,
+            page_size=args.page_size,
+            parallel=args.parallel,
+            retain_details=not args.drop_details,
+            from_history=args.history,
+        )
+        fetched = time.perf_counter()
+        process_media(
+            {TV_LIBRARY: "sonarr", MOVIE_LIBRARY: "radarr"},
+            {"sonarr": sonarr_client, "radarr": radarr_client},
+            args.dry_run,
+            watched_media,
+            parallel=args.parallel,
+        )
+        finished = time.perf_counter()
+
+        peak_memory = None
+        if args.memory:
+            peak_memory = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+            tracemalloc.stop()
+
+        return BenchmarkResult(
+            episodes=library.episodes,
+            movies=library.movies,
+            watched=sum(len(result.watched) for result in watched_media.values()),
+            wall_seconds=round(finished - started, 3),
+            fetch_seconds=round(fetched - started, 3),
+            process_seconds=round(finished - fetched, 3),
+            plex_requests=plex.request_count,
+            sonarr_requests=sonarr.request_count,
+            radarr_requests=radarr.request_count,
+            unmonitored_episodes=len(sonarr.unmonitored),
+            unmonitored_movies=len(radarr.unmonitored),
+            peak_memory_mb=peak_memory,
+        )
+
+
+# (attribute, header) of each column in the results table
+RESULT_COLUMNS = [
+    ("episodes", "Episodes"),
+    ("movies", "Movies"),
+    ("watched", "Watched"),
+    ("wall_seconds", "Wall (s)"),
+    ("fetch_seconds", "Fetch (s)"),
+    ("process_seconds", "Process (s)"),
+    ("plex_requests", "Plex req"),
+    ("sonarr_requests", "Sonarr req"),
+    ("radarr_requests", "Radarr req"),
+    ("peak_memory_mb", "Peak MB"),
+]
+
+
+def print_table(results: list, columns: list[tuple[str, str]] = RESULT_COLUMNS) -> None:
+    rows = [[header for _, header in columns]]
+    rows += [
+        ["-" if (value := getattr(result, key)) is None else str(value) for key, _ in columns] for result in results
+    ]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths, strict=True)))
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark Plex Unmonitorr against local stand-in servers")
+    parser.add_argument("--episodes", type=int, nargs="+", default=DEFAULT_SIZES, help="Library sizes to run")
+    parser.add_argument("--movies", type=int, help="Number of movies (default: a tenth of the episodes)")
+    parser.add_argument("--episodes-per-series", type=int, default=100)
+    parser.add_argument("--watched-ratio", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each server waits before answering")
+    parser.add_argument("--page-size", type=int, default=1000, help="Plex page size (0 = fetch in one request)")
+    parser.add_argument("--days-back", type=int)
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--parallel", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--history", action="store_true", help="Read recent plays from the watch history")
+    parser.add_argument("--drop-details", action="store_true", help="Run with retain_media_details off")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Don't trace peak memory")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+    args.page_size = args.page_size or None
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    results = []
+    for episodes in args.episodes:
+        library = SyntheticLibrary(
+            episodes=episodes,
+            movies=args.movies if args.movies is not None else episodes // 10,
+            episodes_per_series=args.episodes_per_series,
+            watched_ratio=args.watched_ratio,
+        )
+        print(f"Running {episodes} episodes, {library.movies} movies...", file=sys.stderr)
+        results.append(run_benchmark(library, args))
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(result) for result in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import logging
+import sys
+
+from dotenv import load_dotenv
+
+from plex_unmonitorr.config import Config
+from plex_unmonitorr.logging_config import setup_logging
+from plex_unmonitorr.main import build_clients
+from plex_unmonitorr.plan import ChangePlan
+from plex_unmonitorr.process_media import LibraryChanges, unmonitor_episodes, unmonitor_movies
+from plex_unmonitorr.radarr_client import RadarrClient
+from plex_unmonitorr.sonarr_client import SonarrClient
+from plex_unmonitorr.state_store import StateStore
+
+logger = logging.getLogger("apply")
+
+
+def apply_plan(
+    plan: ChangePlan,
+    clients: dict[str, SonarrClient | RadarrClient],
+    state: StateStore | None = None,
+) -> bool:
+    """Unmonitor everything in a plan through the bulk endpoints, returning False if anything failed."""
+    complete = True
+    for client_name, client_plan in plan.clients.items():
+        client = clients.get(client_name)
+        expected = SonarrClient if client_plan["type"] == "sonarr" else RadarrClient
+        if not isinstance(client, expected):
+            logger.error(f"Plan needs {client_plan['type']} client {client_name}, which is not configured")
+            complete = False
+            continue
+
+        for library_title, item_ids in client_plan["libraries"].items():
+            changes = LibraryChanges(pending={item_id: [] for item_id in item_ids})
+            unmonitor = unmonitor_episodes if isinstance(client, SonarrClient) else unmonitor_movies
+            unmonitored = unmonitor(library_title, changes, client, dry_run=False)
+            if len(unmonitored) < len(changes.pending):
+                complete = False
+            # Remember the IDs so later runs don't send them again; the Plex side is left to the next run
+            if state and unmonitored:
+                state.record_library(library_title, client_name, [], unmonitored)
+    return complete
+
+
+def main():
+    """Apply a saved plan: `python -m plex_unmonitorr.apply [plan file]`, defaulting to `settings.plan_file`."""
+    load_dotenv()
+    setup_logging()
+
+    config = Config()
+    plan_path = sys.argv[1] if len(sys.argv) > 1 else config.plan_file
+    if not plan_path:
+        logger.error("No plan given; pass a plan file or set settings.plan_file")
+        sys.exit(2)
+
+    plan = ChangePlan.load(plan_path)
+    logger.info(f"Applying plan from {plan_path} with {plan.count()} items to unmonitor")
+
+    clients = build_clients(config)
+    state = StateStore(config.state_file) if config.state_file else None
+    try:
+        complete = apply_plan(plan, clients, state)
+    finally:
+        for client in clients.values():
+            client.close()
+        if state:
+            state.close()
+
+    if not complete:
+        logger.error("Some items in the plan could not be unmonitored")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
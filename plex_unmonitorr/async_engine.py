@@ -0,0 +1,847 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+from urllib.parse import urljoin
+
+from plex_unmonitorr.config import Config
+from plex_unmonitorr.decoding import EPISODE_LIST, LIBRARY_CONTENT, MOVIE_LIST, SERIES_LIST, decode
+from plex_unmonitorr.episode_cache import DEFAULT_MAX_EPISODES, EpisodeCache, series_fingerprint
+from plex_unmonitorr.library_service import (
+    METADATA_BATCH_SIZE,
+    Library,
+    Media,
+    WatchedMedia,
+    collect_history_keys,
+    encode_watched,
+    filter_watched,
+    get_days_back_cutoff,
+    get_library_cutoff,
+    get_media_type,
+    get_unchanged_watched,
+    library_fingerprint,
+    merge_watched_content,
+    parse_libraries,
+    parse_library_content,
+    parse_media_item,
+    snapshot_key,
+)
+from plex_unmonitorr.metrics import metrics
+from plex_unmonitorr.plan import ChangePlan
+from plex_unmonitorr.plex_client import DEFAULT_PAGE_SIZE, MEDIA_TYPE, PlexClient
+from plex_unmonitorr.process_media import (
+    LibraryChanges,
+    LibraryResult,
+    batch_retry_delay,
+    build_episode_lookup,
+    build_result,
+    group_movies_by_tmdb,
+    group_shows_by_tvdb,
+    match_episodes,
+    match_movies,
+    match_series,
+    record_result,
+)
+from plex_unmonitorr.radarr_client import DEFAULT_BATCH_SIZE
+from plex_unmonitorr.request_scheduler import DEFAULT_MAX_CONCURRENCY
+from plex_unmonitorr.resilience import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_RETRIES,
+    RETRY_STATUSES,
+    CircuitBreaker,
+    CircuitOpenError,
+    request_options,
+    retry_delay,
+)
+from plex_unmonitorr.sonarr_client import (
+    DEFAULT_BATCH_RETRIES,
+    DEFAULT_BATCH_WORKERS,
+    DEFAULT_EPISODE_BATCH_SIZE,
+    DEFAULT_MAX_WORKERS,
+)
+from plex_unmonitorr.state_store import StateStore
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+"""
+Alternative asyncio engine: the same fetch, match and unmonitor pipeline as `library_service` and
+`process_media`, but with every Plex/Sonarr/Radarr request issued from one event loop over a shared
+connection pool. Install with `pip install plex-unmonitorr[async]`.
+"""
+
+logger = logging.getLogger("async_engine")
+
+# Total connections shared by all clients in the pool
+CONNECTION_LIMIT = 100
+
+
+def _clean_params(params: dict[str, Any] | None) -> dict[str, Any] | None:
+    # aiohttp rejects None values, which requests silently drops
+    if params is None:
+        return None
+    return {key: value for key, value in params.items() if value is not None}
+
+
+async def _send(
+    session: "aiohttp.ClientSession",
+    name: str,
+    method: str,
+    url: str,
+    headers: dict[str, str],
+    params: dict[str, Any] | None = None,
+    body: dict[str, Any] | None = None,
+    timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+    retries: int = DEFAULT_RETRIES,
+    breaker: CircuitBreaker | None = None,
+) -> bytes:
+    """Async variant of `send_with_retries`, returning the response body."""
+    client_timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+    attempts = retries + 1 if method == "GET" else 1
+    for attempt in range(attempts):
+        if breaker:
+            breaker.before_request()
+        started = time.perf_counter()
+        try:
+            async with session.request(
+                method, url, params=_clean_params(params), json=body, headers=headers, timeout=client_timeout
+            ) as response:
+                content = await response.read()
+        except Exception as e:
+            metrics.observe_request(name, method, "error", time.perf_counter() - started, 0)
+            if breaker:
+                breaker.record_failure()
+            if not isinstance(e, (TimeoutError, aiohttp.ClientConnectionError)) or attempt == attempts - 1:
+                raise
+            error = str(e) or type(e).__name__
+        else:
+            metrics.observe_request(name, method, str(response.status), time.perf_counter() - started, len(content))
+            if breaker:
+                if response.status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if response.status not in RETRY_STATUSES or attempt == attempts - 1:
+                response.raise_for_status()
+                return content
+            error = f"HTTP {response.status}"
+
+        delay = retry_delay(attempt)
+        logger.debug(f"{method} {url} failed ({error}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+
+class AsyncPlexClient:
+    def __init__(
+        self,
+        session: "aiohttp.ClientSession",
+        base_url: str,
+        token: str,
+        name: str = "plex",
+        timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+        retries: int = DEFAULT_RETRIES,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.session = session
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker
+        self.headers = {
+            "X-Plex-Token": token,
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, br",
+        }
+
+    async def _make_request(
+        self, endpoint: str, params: dict[str, Any] | None = None, schema: Any = None
+    ) -> dict[str, Any]:
+        url = urljoin(self.base_url, endpoint)
+        content = await _send(
+            self.session,
+            self.name,
+            "GET",
+            url,
+            self.headers,
+            params,
+            timeout=self.timeout,
+            retries=self.retries,
+            breaker=self.breaker,
+        )
+        return decode(content, schema)
+
+    async def get_libraries(self) -> dict[str, Any]:
+        return await self._make_request("/library/sections")
+
+    async def get_latest_watched(self, library_id: str, media_type: MEDIA_TYPE) -> dict[str, Any]:
+        return await self._make_request(
+            f"/library/sections/{library_id}/all",
+            params=PlexClient._latest_watched_params(media_type),
+            schema=LIBRARY_CONTENT,
+        )
+
+    async def get_metadata_items(self, rating_keys: list[str]) -> dict[str, Any]:
+        return await self._make_request(
+            f"/library/metadata/{','.join(rating_keys)}", params={"includeGuids": 1}, schema=LIBRARY_CONTENT
+        )
+
+    def iter_history(
+        self, library_id: str, viewed_after: int | None = None, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Get the play history of a library, newest first, one page at a time"""
+        return self._iter_pages(
+            "/status/sessions/history/all", PlexClient._history_params(library_id, viewed_after), page_size
+        )
+
+    def iter_library_content(
+        self,
+        library_id: str,
+        media_type: MEDIA_TYPE,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        watched_only: bool = False,
+        viewed_after: int | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Get content from a specific library one page at a time"""
+        return self._iter_pages(
+            f"/library/sections/{library_id}/all",
+            PlexClient._content_params(media_type, watched_only, viewed_after),
+            page_size,
+        )
+
+    async def _iter_pages(self, endpoint: str, params: dict[str, Any], page_size: int) -> AsyncIterator[dict[str, Any]]:
+        start = 0
+        while True:
+            page = await self._make_request(
+                endpoint,
+                params=PlexClient._page_params(params, start, page_size),
+                schema=LIBRARY_CONTENT,
+            )
+            yield page
+
+            start = PlexClient._next_page_start(page, start, page_size)
+            if start is None:
+                break
+
+
+class AsyncSonarrClient:
+    def __init__(
+        self,
+        session: "aiohttp.ClientSession",
+        base_url: str,
+        api_key: str,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        episode_cache: EpisodeCache | None = None,
+        name: str = "sonarr",
+        batch_size: int = DEFAULT_EPISODE_BATCH_SIZE,
+        batch_workers: int = DEFAULT_BATCH_WORKERS,
+        batch_retries: int = DEFAULT_BATCH_RETRIES,
+        timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+        retries: int = DEFAULT_RETRIES,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.session = session
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker
+        self.batch_size = batch_size
+        self.batch_workers = batch_workers
+        self.batch_retries = batch_retries
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "X-Api-Key": api_key,
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, br",
+        }
+        self.max_workers = max_workers
+        self.episode_cache = episode_cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._index_lock = asyncio.Lock()
+        self._series_index: dict[str, dict[str, Any]] | None = None
+
+    async def _make_request(
+        self,
+        endpoint: str,
+        method: str = "GET",
+        params: dict[str, Any] | None = None,
+        body: dict[str | Any] | None = None,
+        schema: Any = None,
+    ) -> Any:
+        url = urljoin(self.base_url, endpoint)
+        async with self._semaphore:
+            content = await _send(
+                self.session,
+                self.name,
+                method,
+                url,
+                self.headers,
+                params,
+                body,
+                self.timeout,
+                self.retries,
+                self.breaker,
+            )
+        return decode(content, schema)
+
+    async def get_all_series(self) -> list[dict[str, Any]]:
+        return await self._make_request("/api/v3/series", schema=SERIES_LIST)
+
+    async def get_series_index(self) -> dict[str, dict[str, Any]]:
+        """Get all series keyed by TVDB ID, fetched once and reused for the lifetime of the client"""
+        async with self._index_lock:
+            if self._series_index is None:
+                self._series_index = {
+                    str(series["tvdbId"]): series for series in await self.get_all_series() if series.get("tvdbId")
+                }
+        return self._series_index
+
+    async def get_episodes(self, series_id: int) -> list[dict[str, Any]]:
+        return await self._make_request("/api/v3/episode", params={"seriesId": series_id}, schema=EPISODE_LIST)
+
+    async def get_series_episodes(self, series: dict[str, Any]) -> list[dict[str, Any]]:
+        """Get all episodes for a series, reusing the cached list if the series hasn't changed since"""
+        if self.episode_cache is None:
+            return await self.get_episodes(series["id"])
+
+        fingerprint = series_fingerprint(series)
+        episodes = self.episode_cache.get(series["id"], fingerprint)
+        if episodes is None:
+            episodes = self.episode_cache.put(series["id"], fingerprint, await self.get_episodes(series["id"]))
+        return episodes
+
+    async def set_episode_monitor(self, episode_ids: list[int], monitored: bool) -> None:
+        result = await self._make_request(
+            "/api/v3/episode/monitor", method="PUT", body={"episodeIds": episode_ids, "monitored": monitored}
+        )
+        if self.episode_cache is not None:
+            self.episode_cache.update_monitored(episode_ids, monitored)
+        return result
+
+
+class AsyncRadarrClient:
+    def __init__(
+        self,
+        session: "aiohttp.ClientSession",
+        base_url: str,
+        api_key: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        name: str = "radarr",
+        timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+        retries: int = DEFAULT_RETRIES,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.session = session
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "X-Api-Key": api_key,
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, br",
+        }
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._index_lock = asyncio.Lock()
+        self._movie_index: dict[str, dict[str, Any]] | None = None
+
+    async def _make_request(
+        self,
+        endpoint: str,
+        method: str = "GET",
+        params: dict[str, Any] | None = None,
+        body: dict[str | Any] | None = None,
+        schema: Any = None,
+    ) -> Any:
+        url = urljoin(self.base_url, endpoint)
+        async with self._semaphore:
+            content = await _send(
+                self.session,
+                self.name,
+                method,
+                url,
+                self.headers,
+                params,
+                body,
+                self.timeout,
+                self.retries,
+                self.breaker,
+            )
+        return decode(content, schema)
+
+    async def get_all_movies(self) -> list[dict[str, Any]]:
+        return await self._make_request("/api/v3/movie", schema=MOVIE_LIST)
+
+    async def get_movie_index(self) -> dict[str, dict[str, Any]]:
+        """Get all movies keyed by TMDB ID, fetched once and reused for the lifetime of the client"""
+        async with self._index_lock:
+            if self._movie_index is None:
+                self._movie_index = {
+                    str(movie["tmdbId"]): movie for movie in await self.get_all_movies() if movie.get("tmdbId")
+                }
+        return self._movie_index
+
+    async def set_movie_monitor(self, movie_ids: list[int], monitored: bool) -> None:
+        result = await self._make_request(
+            "/api/v3/movie/editor", method="PUT", body={"movieIds": movie_ids, "monitored": monitored}
+        )
+
+        # Keep the cached index in step so later libraries see the new state
+        if self._movie_index is not None:
+            updated = set(movie_ids)
+            for movie in self._movie_index.values():
+                if movie["id"] in updated:
+                    movie["monitored"] = monitored
+
+        return result
+
+
+async def get_library_watched_async(
+    plex: AsyncPlexClient,
+    library: Library,
+    last_watched_cutoff: int | None,
+    page_size: int,
+    state: StateStore | None = None,
+    retain_details: bool = True,
+    from_history: bool = False,
+) -> WatchedMedia:
+    last_watched_cutoff, handled = get_library_cutoff(library, last_watched_cutoff, state)
+    if state is None:
+        return await fetch_library_watched_async(
+            plex, library, last_watched_cutoff, handled, page_size, retain_details, from_history
+        )
+
+    fingerprint = library_fingerprint(
+        library, await plex.get_latest_watched(library.id, get_media_type(library)), retain_details
+    )
+    watched = get_unchanged_watched(state, library, fingerprint, last_watched_cutoff, handled)
+    if watched is not None:
+        metrics.count("unchanged", library.title, len(watched))
+        return WatchedMedia(library=library, watched=watched)
+
+    result = await fetch_library_watched_async(
+        plex, library, last_watched_cutoff, handled, page_size, retain_details, from_history
+    )
+    state.save_snapshot(snapshot_key(library), fingerprint, last_watched_cutoff, encode_watched(result.watched))
+    return result
+
+
+async def fetch_library_watched_async(
+    plex: AsyncPlexClient,
+    library: Library,
+    last_watched_cutoff: int | None,
+    handled: set[str],
+    page_size: int,
+    retain_details: bool = True,
+    from_history: bool = False,
+) -> WatchedMedia:
+    if from_history and last_watched_cutoff is not None:
+        pages = [page async for page in plex.iter_history(library.id, last_watched_cutoff, page_size)]
+        rating_keys = collect_history_keys(pages, library, handled)
+        batches = await asyncio.gather(
+            *(
+                plex.get_metadata_items(rating_keys[start : start + METADATA_BATCH_SIZE])
+                for start in range(0, len(rating_keys), METADATA_BATCH_SIZE)
+            )
+        )
+        watched = []
+        for page in batches:
+            watched.extend(filter_watched(parse_library_content(page, retain_details), last_watched_cutoff, handled))
+        return WatchedMedia(library=library, watched=watched)
+
+    media_type = get_media_type(library)
+
+    watched = []
+    async for page in plex.iter_library_content(
+        library.id, media_type, page_size, watched_only=True, viewed_after=last_watched_cutoff
+    ):
+        media = (parse_media_item(item, retain_details) for item in page.get("MediaContainer", {}).get("Metadata", []))
+        watched.extend(filter_watched(media, last_watched_cutoff, handled))
+
+    return WatchedMedia(library=library, watched=watched)
+
+
+async def get_watched_content_async(
+    plex: AsyncPlexClient,
+    enabled_libraries: list[str],
+    days_back: int | None = None,
+    page_size: int | None = DEFAULT_PAGE_SIZE,
+    state: StateStore | None = None,
+    retain_details: bool = True,
+    from_history: bool = False,
+    server: str = "",
+) -> dict[str, WatchedMedia]:
+    """Async variant of `get_watched_content`; all libraries are fetched concurrently."""
+    last_watched_cutoff = get_days_back_cutoff(days_back)
+    libraries = parse_libraries(await plex.get_libraries(), enabled_libraries, server)
+
+    results = await asyncio.gather(
+        *(
+            get_library_watched_async(
+                plex, library, last_watched_cutoff, page_size or DEFAULT_PAGE_SIZE, state, retain_details, from_history
+            )
+            for library in libraries
+        )
+    )
+    return {result.library.title: result for result in results}
+
+
+async def get_watched_from_servers_async(
+    plex_clients: dict[str, AsyncPlexClient],
+    enabled_libraries: list[str],
+    days_back: int | None = None,
+    page_size: int | None = DEFAULT_PAGE_SIZE,
+    state: StateStore | None = None,
+    retain_details: bool = True,
+    from_history: bool = False,
+) -> dict[str, WatchedMedia]:
+    """Async variant of `collect_watched_from_servers`; all servers are fetched concurrently."""
+    if len(plex_clients) == 1:
+        plex = next(iter(plex_clients.values()))
+        return await get_watched_content_async(
+            plex, enabled_libraries, days_back, page_size, state, retain_details, from_history
+        )
+
+    results = await asyncio.gather(
+        *(
+            get_watched_content_async(
+                plex, enabled_libraries, days_back, page_size, state, retain_details, from_history, server
+            )
+            for server, plex in plex_clients.items()
+        )
+    )
+    return merge_watched_content(dict(zip(plex_clients, results, strict=True)))
+
+
+async def find_show_changes_async(
+    library_title: str,
+    media: list[Media],
+    client: AsyncSonarrClient,
+    ignored_tvdb_ids: list[str] = None,
+    handled_ids: set[int] | None = None,
+) -> LibraryChanges:
+    """Async variant of `find_show_changes`."""
+    changes = LibraryChanges()
+    shows_by_tvdb = group_shows_by_tvdb(media, ignored_tvdb_ids or [], changes.unmatched)
+    if not shows_by_tvdb:
+        return changes
+
+    try:
+        series_index = await client.get_series_index()
+    except Exception as e:
+        logger.error(f"Failed to get series from Sonarr for {library_title}: {e}")
+        changes.failed = list(media)
+        return changes
+
+    matched_series = match_series(shows_by_tvdb, series_index, changes.unmatched)
+
+    # Bound the number of episode lists in flight per library, like the sync worker pool
+    workers = asyncio.Semaphore(client.max_workers)
+
+    async def get_episode_lookup(series: dict[str, Any]) -> dict[tuple[int, int], dict]:
+        async with workers:
+            return build_episode_lookup(await client.get_series_episodes(series))
+
+    lookups = await asyncio.gather(
+        *(get_episode_lookup(series_data) for _, series_data, _ in matched_series), return_exceptions=True
+    )
+
+    skipped = 0
+    for (tvdb_id, series_data, watched_episodes), lookup in zip(matched_series, lookups, strict=True):
+        if isinstance(lookup, CircuitOpenError):
+            skipped += 1
+            changes.failed.extend(watched_episodes)
+            continue
+        if isinstance(lookup, Exception):
+            logger.error(f"Error processing TVDB ID {tvdb_id}: {lookup}")
+            changes.failed.extend(watched_episodes)
+            continue
+        for episode_id, watched_ep in match_episodes(
+            series_data["title"], watched_episodes, lookup, handled_ids, changes.unmatched
+        ):
+            changes.pending.setdefault(episode_id, []).append(watched_ep)
+
+    if skipped:
+        logger.error(f"Skipped {skipped} series in {library_title} because Sonarr is unavailable")
+    return changes
+
+
+async def set_episode_monitor_with_retry_async(
+    client: AsyncSonarrClient, episode_ids: list[int], monitored: bool
+) -> None:
+    """Async variant of `set_episode_monitor_with_retry`."""
+    for attempt in range(client.batch_retries + 1):
+        try:
+            await client.set_episode_monitor(episode_ids, monitored)
+            return
+        except Exception as e:
+            await asyncio.sleep(batch_retry_delay(client, episode_ids, attempt, e))
+
+
+async def unmonitor_episodes_async(
+    library_title: str, changes: LibraryChanges, client: AsyncSonarrClient, dry_run: bool
+) -> list[int]:
+    """Async variant of `unmonitor_episodes`."""
+    episodes_to_unmonitor = list(changes.pending)
+    if not episodes_to_unmonitor:
+        logger.debug(f"No episodes to unmonitor in {library_title}")
+        return []
+
+    if dry_run:
+        logger.info(f"DRY RUN: Would unmonitor {len(episodes_to_unmonitor)} episodes in {library_title}")
+        return []
+
+    batches = [
+        episodes_to_unmonitor[start : start + client.batch_size]
+        for start in range(0, len(episodes_to_unmonitor), client.batch_size)
+    ]
+    batch_workers = asyncio.Semaphore(client.batch_workers)
+
+    async def send_batch(episode_ids: list[int]) -> None:
+        async with batch_workers:
+            await set_episode_monitor_with_retry_async(client, episode_ids, False)
+
+    results = await asyncio.gather(*(send_batch(batch) for batch in batches), return_exceptions=True)
+
+    unmonitored = []
+    for number, (batch, result) in enumerate(zip(batches, results, strict=True), start=1):
+        if isinstance(result, Exception):
+            logger.error(
+                f"Failed to unmonitor batch {number}/{len(batches)} ({len(batch)} episodes) in {library_title}: {result}"
+            )
+            for episode_id in batch:
+                changes.failed.extend(changes.pending[episode_id])
+        else:
+            unmonitored.extend(batch)
+            if len(batches) > 1:
+                logger.info(f"Unmonitored batch {number}/{len(batches)} ({len(batch)} episodes) in {library_title}")
+
+    if unmonitored:
+        logger.info(f"Successfully unmonitored {len(unmonitored)} episodes in {library_title}")
+    return unmonitored
+
+
+async def process_show_library_async(
+    library_title: str,
+    media: list[Media],
+    client: AsyncSonarrClient,
+    dry_run: bool,
+    ignored_tvdb_ids: list[str] = None,
+    handled_ids: set[int] | None = None,
+) -> LibraryResult:
+    changes = await find_show_changes_async(library_title, media, client, ignored_tvdb_ids, handled_ids)
+    unmonitored = await unmonitor_episodes_async(library_title, changes, client, dry_run)
+
+    metrics.count("scanned", library_title, len(media))
+    metrics.count("matched", library_title, len(changes.pending))
+    metrics.count("unmonitored", library_title, len(unmonitored))
+    return build_result(media, changes, unmonitored)
+
+
+async def find_movie_changes_async(
+    library_title: str,
+    media: list[Media],
+    client: AsyncRadarrClient,
+    ignored_tmdb_ids: list[str] = None,
+    handled_ids: set[int] | None = None,
+) -> LibraryChanges:
+    """Async variant of `find_movie_changes`."""
+    changes = LibraryChanges()
+    movies = group_movies_by_tmdb(media, ignored_tmdb_ids or [], changes.unmatched)
+    if not movies:
+        return changes
+
+    try:
+        movie_index = await client.get_movie_index()
+    except Exception as e:
+        logger.error(f"Failed to get movies from Radarr for {library_title}: {e}")
+        changes.failed = list(media)
+        return changes
+
+    changes.pending = match_movies(movies, movie_index, handled_ids, changes.unmatched)
+    return changes
+
+
+async def unmonitor_movies_async(
+    library_title: str, changes: LibraryChanges, client: AsyncRadarrClient, dry_run: bool
+) -> list[int]:
+    """Async variant of `unmonitor_movies`, sending the batches one at a time like it does."""
+    movies_to_unmonitor = list(changes.pending)
+    if not movies_to_unmonitor:
+        logger.debug(f"No movies to unmonitor in {library_title}")
+        return []
+
+    if dry_run:
+        logger.info(f"DRY RUN: Would unmonitor {len(movies_to_unmonitor)} movies in {library_title}")
+        return []
+
+    unmonitored = []
+    for start in range(0, len(movies_to_unmonitor), client.batch_size):
+        batch = movies_to_unmonitor[start : start + client.batch_size]
+        try:
+            await client.set_movie_monitor(batch, False)
+            unmonitored.extend(batch)
+        except Exception as e:
+            logger.error(f"Failed to unmonitor {len(batch)} movies in {library_title}: {e}")
+            for movie_id in batch:
+                changes.failed.extend(changes.pending[movie_id])
+    if unmonitored:
+        logger.info(f"Successfully unmonitored {len(unmonitored)} movies in {library_title}")
+    return unmonitored
+
+
+async def process_movie_library_async(
+    library_title: str,
+    media: list[Media],
+    client: AsyncRadarrClient,
+    dry_run: bool,
+    ignored_tmdb_ids: list[str] = None,
+    handled_ids: set[int] | None = None,
+) -> LibraryResult:
+    changes = await find_movie_changes_async(library_title, media, client, ignored_tmdb_ids, handled_ids)
+    unmonitored = await unmonitor_movies_async(library_title, changes, client, dry_run)
+
+    metrics.count("scanned", library_title, len(media))
+    metrics.count("matched", library_title, len(changes.pending))
+    metrics.count("unmonitored", library_title, len(unmonitored))
+    return build_result(media, changes, unmonitored)
+
+
+async def process_media_async(
+    libraries: dict[str, str],
+    clients: dict[str, AsyncSonarrClient | AsyncRadarrClient],
+    dry_run: bool,
+    watched_media: dict[str, WatchedMedia],
+    ignored_tmdb_ids: list[str] = None,
+    ignored_tvdb_ids: list[str] = None,
+    state: StateStore | None = None,
+    plan: ChangePlan | None = None,
+):
+    """Async variant of `process_media`; libraries run concurrently, one at a time per client."""
+    client_locks = defaultdict(asyncio.Lock)
+
+    async def process_library(library_title: str, items: WatchedMedia) -> None:
+        client_name = libraries.get(library_title, "")
+        client = clients.get(client_name)
+        if not client:
+            logger.warning(f"No client configured for library: {library_title}")
+            return
+
+        async with client_locks[client_name]:
+            if client.breaker and client.breaker.is_open:
+                logger.warning(f"Skipping library {library_title}: {client_name} is unavailable")
+                return
+            logger.debug(f"Library: {library_title}")
+            handled_ids = state.get_handled_items(client_name) if state else None
+            if items.library.type == "show":
+                result = await process_show_library_async(
+                    library_title, items.watched, client, dry_run, ignored_tvdb_ids, handled_ids
+                )
+            elif items.library.type == "movie":
+                result = await process_movie_library_async(
+                    library_title, items.watched, client, dry_run, ignored_tmdb_ids, handled_ids
+                )
+            else:
+                raise ValueError(f"Unsupported library type: {items.library.type}")
+
+            if plan is not None:
+                client_type = "sonarr" if isinstance(client, AsyncSonarrClient) else "radarr"
+                plan.add(client_name, client_type, library_title, result.pending)
+            # Dry runs don't change anything, so there is nothing to remember
+            if state and not dry_run:
+                record_result(state, library_title, client_name, items, result)
+
+    await asyncio.gather(*(process_library(title, items) for title, items in watched_media.items()))
+
+
+async def run_async(config: Config, state: StateStore | None = None) -> None:
+    """Run one full cycle on the async engine."""
+    if aiohttp is None:
+        raise ImportError("The async engine requires aiohttp, install it with `pip install plex-unmonitorr[async]`")
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=CONNECTION_LIMIT)) as session:
+        clients = {}
+        for client_name, client_config in config.clients_config.items():
+            max_concurrency = client_config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+            if client_config["type"] == "sonarr":
+                cache_path = Path(config.cache_dir) / f"episodes-{client_name}.json.gz" if config.cache_dir else None
+                episode_cache = EpisodeCache(client_config.get("episode_cache_size", DEFAULT_MAX_EPISODES), cache_path)
+                episode_cache.load()
+                clients[client_name] = AsyncSonarrClient(
+                    session,
+                    client_config["url"],
+                    client_config["api_key"],
+                    max_workers=client_config.get("max_workers", DEFAULT_MAX_WORKERS),
+                    max_concurrency=max_concurrency,
+                    episode_cache=episode_cache,
+                    name=client_name,
+                    batch_size=client_config.get("batch_size", DEFAULT_EPISODE_BATCH_SIZE),
+                    batch_workers=client_config.get("batch_workers", DEFAULT_BATCH_WORKERS),
+                    batch_retries=client_config.get("batch_retries", DEFAULT_BATCH_RETRIES),
+                    **request_options(client_name, client_config),
+                )
+            elif client_config["type"] == "radarr":
+                clients[client_name] = AsyncRadarrClient(
+                    session,
+                    client_config["url"],
+                    client_config["api_key"],
+                    batch_size=client_config.get("batch_size", DEFAULT_BATCH_SIZE),
+                    max_concurrency=max_concurrency,
+                    name=client_name,
+                    **request_options(client_name, client_config),
+                )
+            else:
+                raise ValueError(f"Unsupported client type: {client_config['type']}")
+
+        plex_clients = {
+            name: AsyncPlexClient(session, server["url"], server["token"], name, **request_options(name, server))
+            for name, server in config.plex_servers.items()
+        }
+
+        plan = ChangePlan() if config.plan_file else None
+        metrics.reset()
+        logger.debug("Getting played media from Plex...")
+        # Stages overlap on the event loop, so only the two phases of the run are timed
+        with metrics.stage("plex_fetch"):
+            watched_media = await get_watched_from_servers_async(
+                plex_clients,
+                config.libraries.keys(),
+                config.days_back,
+                config.page_size,
+                state,
+                config.retain_media_details,
+                config.ingestion == "history",
+            )
+        with metrics.stage("process"):
+            await process_media_async(
+                config.libraries,
+                clients,
+                config.dry_run,
+                watched_media,
+                config.ignored_tmdb_ids,
+                config.ignored_tvdb_ids,
+                state,
+                plan,
+            )
+        if plan is not None:
+            plan.save(config.plan_file)
+
+        for client_name, client in clients.items():
+            if episode_cache := getattr(client, "episode_cache", None):
+                logger.info(
+                    f"Episode cache for {client_name}: {episode_cache.hits} hits, {episode_cache.misses} misses"
+                )
+                episode_cache.reset_stats()
+                episode_cache.save()
+
+    metrics.report(config.metrics_file, config.metrics_summary_file)
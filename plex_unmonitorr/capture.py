@@ -0,0 +1,224 @@
+import gzip
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+from plex_unmonitorr.config import Config
+from plex_unmonitorr.metrics import Metrics, metrics
+
+"""
+Record and replay of the HTTP traffic between Plex Unmonitorr and Plex, Sonarr and Radarr.
+
+A capture is a gzip-compressed JSON Lines file: a header line describing the run (library mapping, client
+types and settings, without URLs or credentials), then one line per request with the client name, method,
+path and query, request body, response status, content type and response body. Tokens and API keys are
+removed from the query and replaced in response bodies, and hosts are left out, so captures can be shared.
+
+`ReplayAdapter` serves a capture to a session instead of the network; see `benchmarks.replay`.
+"""
+
+logger = logging.getLogger("capture")
+
+# Query parameters and headers that carry credentials
+SECRET_PARAMS = frozenset({"X-Plex-Token", "apikey", "api_key"})
+SECRET_HEADERS = ("X-Plex-Token", "X-Api-Key")
+REDACTED = "REDACTED"
+
+# Query parameters derived from the current time, which differ between recording and replaying
+VOLATILE_PARAMS = frozenset({"lastViewedAt>>", "viewedAt>>"})
+
+# Settings that are safe to keep in a capture and that replaying needs
+CAPTURED_SETTINGS = (
+    "days_back",
+    "page_size",
+    "parallel",
+    "ingestion",
+    "retain_media_details",
+    "dry_run",
+    "ignored_tmdb_ids",
+    "ignored_tvdb_ids",
+)
+
+
+def request_key(client: str, method: str, url: str, body: bytes | str | None, strict: bool = True) -> str:
+    """Identify a request by everything but its host and credentials.
+
+    The loose (`strict=False`) key also ignores time-based filters and the body, so a replay still finds a
+    response when the cutoff moved on or a bulk update lists its IDs differently.
+    """
+    parts = urlsplit(url)
+    ignored = SECRET_PARAMS if strict else SECRET_PARAMS | VOLATILE_PARAMS
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if name not in ignored
+    )
+    key = [client, method, parts.path, urlencode(query)]
+    if strict and body:
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", errors="replace")
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True)
+        except ValueError:
+            pass
+        key.append(body)
+    return json.dumps(key)
+
+
+def capture_run_info(config: Config) -> dict[str, Any]:
+    """What a replay needs to know about the run, leaving out URLs and credentials."""
+    clients = {name: "plex" for name in config.plex_servers}
+    clients.update({name: client_config["type"] for name, client_config in config.clients_config.items()})
+    return {
+        "libraries": config.libraries,
+        "clients": clients,
+        "settings": {key: getattr(config, key) for key in CAPTURED_SETTINGS},
+    }
+
+
+class CaptureWriter:
+    """Writes the responses of one run to a capture file, from any number of sessions and threads."""
+
+    def __init__(self, path: str | Path, run_info: dict[str, Any] | None = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.count = 0
+        self._secrets: set[str] = set()
+        self._lock = threading.Lock()
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        self._write({"type": "run", "created": int(time.time()), **(run_info or {})})
+
+    def _write(self, entry: dict[str, Any]) -> None:
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def _redact(self, text: str) -> str:
+        for secret in self._secrets:
+            text = text.replace(secret, REDACTED)
+        return text
+
+    def record_session(self, session: requests.Session, client: str) -> None:
+        """Record every response the session receives under the client name"""
+        self._secrets.update(value for name in SECRET_HEADERS if (value := session.headers.get(name)))
+
+        def hook(response: requests.Response, *args, **kwargs) -> None:
+            self.record(client, response)
+
+        session.hooks["response"].append(hook)
+
+    def record(self, client: str, response: requests.Response) -> None:
+        request = response.request
+        parts = urlsplit(request.url)
+        query = [
+            (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if name not in SECRET_PARAMS
+        ]
+        body = request.body.decode("utf-8", errors="replace") if isinstance(request.body, bytes) else request.body
+        entry = {
+            "type": "response",
+            "client": client,
+            "method": request.method,
+            "url": f"{parts.path}?{urlencode(query)}",
+            "body": self._redact(body) if body else None,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type"),
+            "content": self._redact(response.content.decode("utf-8", errors="replace")),
+        }
+        with self._lock:
+            self._write(entry)
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+        logger.info(f"Captured {self.count} responses to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CaptureArchive:
+    """The responses of a capture file, indexed for replay."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.run_info: dict[str, Any] = {}
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._strict: dict[str, deque[dict[str, Any]]] = defaultdict(deque)
+        self._loose: dict[str, deque[dict[str, Any]]] = defaultdict(deque)
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            for line in file:
+                entry = json.loads(line)
+                if entry["type"] == "run":
+                    self.run_info = entry
+                    continue
+                args = (entry["client"], entry["method"], entry["url"], entry["body"])
+                self._strict[request_key(*args)].append(entry)
+                self._loose[request_key(*args, strict=False)].append(entry)
+        logger.debug(f"Loaded {sum(map(len, self._strict.values()))} responses from {self.path}")
+
+    @property
+    def clients(self) -> dict[str, str]:
+        """Client types by name, including the Plex servers"""
+        return self.run_info.get("clients", {})
+
+    def find(self, client: str, request: requests.PreparedRequest) -> dict[str, Any] | None:
+        """Get the recorded response for a request, in recorded order; the last one is repeated once used up"""
+        with self._lock:
+            for index, strict in ((self._strict, True), (self._loose, False)):
+                responses = index.get(request_key(client, request.method, request.url, request.body, strict))
+                if responses:
+                    return responses.popleft() if len(responses) > 1 else responses[0]
+            self.misses += 1
+            return None
+
+
+class ReplayMissError(requests.RequestException):
+    """Raised for a request that the capture has no response for."""
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers a client's requests from a capture instead of the network"""
+
+    def __init__(self, client: str, archive: CaptureArchive, registry: Metrics | None = None):
+        super().__init__()
+        self.client = client
+        self.archive = archive
+        self.registry = registry or metrics
+
+    def send(self, request: requests.PreparedRequest, *args, **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        entry = self.archive.find(self.client, request)
+        if entry is None:
+            raise ReplayMissError(f"No recorded response for {self.client} {request.method} {request.url}")
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response._content = entry["content"].encode()
+        response.encoding = "utf-8"
+        if entry["content_type"]:
+            response.headers["Content-Type"] = entry["content_type"]
+        response.url = request.url
+        response.request = request
+        self.registry.observe_request(
+            self.client, request.method, str(response.status_code), time.perf_counter() - started, len(response.content)
+        )
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def replay_session(session: requests.Session, client: str, archive: CaptureArchive) -> None:
+    """Serve every request of the session from the capture"""
+    adapter = ReplayAdapter(client, archive)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
@@ -25,13 +25,32 @@ class Config:
         with open(self.config_path) as file:
             return yaml.safe_load(file)
 
+    @property
+    def plex_servers(self) -> dict[str, dict[str, Any]]:
+        """Plex servers by name; `plex` is either a single server or a list of them"""
+        servers = self._config["plex"]
+        if isinstance(servers, dict):
+            return {"plex": servers}
+        named = {}
+        for number, server in enumerate(servers, start=1):
+            name = server.get("name", f"plex{number}")
+            if name in named:
+                raise ValueError(f"Duplicate Plex server name: {name}")
+            named[name] = server
+        return named
+
     @property
     def plex_url(self) -> str:
-        return self._config["plex"]["url"]
+        return self.plex_config["url"]
 
     @property
     def plex_token(self) -> str:
-        return self._config["plex"]["token"]
+        return self.plex_config["token"]
+
+    @property
+    def plex_config(self) -> dict[str, Any]:
+        """The first (or only) Plex server"""
+        return next(iter(self.plex_servers.values()))
 
     @property
     def libraries(self) -> dict[str, str]:
@@ -58,3 +77,83 @@ class Config:
     def ignored_tvdb_ids(self) -> list[str]:
         ids = self._config["settings"].get("ignored_tvdb_ids", [])
         return [str(id_val) for id_val in ids]
+
+    @property
+    def page_size(self) -> int | None:
+        return self._config["settings"].get("page_size", 1000)
+
+    @property
+    def parallel(self) -> bool:
+        return self._config["settings"].get("parallel", False)
+
+    @property
+    def state_file(self) -> str | None:
+        return self._config["settings"].get("state_file")
+
+    @property
+    def cache_ttl(self) -> int:
+        return self._config["settings"].get("cache_ttl", 0)
+
+    @property
+    def webhook_port(self) -> int | None:
+        return (self._config.get("webhook") or {}).get("port")
+
+    @property
+    def webhook_host(self) -> str:
+        return (self._config.get("webhook") or {}).get("host", "0.0.0.0")
+
+    @property
+    def webhook_account_ids(self) -> list[int]:
+        return (self._config.get("webhook") or {}).get("account_ids", [1])
+
+    @property
+    def webhook_debounce(self) -> float:
+        return (self._config.get("webhook") or {}).get("debounce", 30)
+
+    @property
+    def cache_dir(self) -> str | None:
+        return self._config["settings"].get("cache_dir")
+
+    @property
+    def capture_dir(self) -> str | None:
+        return self._config["settings"].get("capture_dir")
+
+    @property
+    def plan_file(self) -> str | None:
+        return self._config["settings"].get("plan_file")
+
+    @property
+    def ingestion(self) -> str:
+        return self._config["settings"].get("ingestion", "library")
+
+    @property
+    def engine(self) -> str:
+        return self._config["settings"].get("engine", "sync")
+
+    @property
+    def retain_media_details(self) -> bool:
+        return self._config["settings"].get("retain_media_details", True)
+
+    @property
+    def profile(self) -> bool:
+        return self._config["settings"].get("profile", False)
+
+    @property
+    def profile_top(self) -> int:
+        return self._config["settings"].get("profile_top", 20)
+
+    @property
+    def metrics_file(self) -> str | None:
+        return (self._config.get("metrics") or {}).get("file")
+
+    @property
+    def metrics_summary_file(self) -> str | None:
+        return (self._config.get("metrics") or {}).get("summary_file")
+
+    @property
+    def metrics_port(self) -> int | None:
+        return (self._config.get("metrics") or {}).get("port")
+
+    @property
+    def metrics_host(self) -> str:
+        return (self._config.get("metrics") or {}).get("host", "0.0.0.0")
@@ -0,0 +1,122 @@
+import logging
+import os
+import signal
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from plex_unmonitorr.config import Config
+from plex_unmonitorr.library_service import WatchedMedia
+from plex_unmonitorr.logging_config import setup_logging
+from plex_unmonitorr.main import build_clients, build_plex_clients, run
+from plex_unmonitorr.metrics import metrics
+from plex_unmonitorr.process_media import process_media
+from plex_unmonitorr.profiling import Profiler, profiling_requested
+from plex_unmonitorr.state_store import StateStore
+from plex_unmonitorr.webhook_server import ScrobbleBatcher, WebhookServer
+
+logger = logging.getLogger("daemon")
+
+
+def main():
+    """
+    Run Plex Unmonitorr continuously, every `SCHEDULE` seconds.
+
+    Unlike restarting `main` in a loop, the clients (and their connection pools), the state store and
+    any cached lookups stay alive between cycles. SIGTERM/SIGINT stop the loop once the current cycle is done.
+    """
+    load_dotenv()
+    setup_logging()
+
+    schedule = int(os.getenv("SCHEDULE", "3600"))
+    logger.info(f"Starting Plex Unmonitorr daemon, running every {schedule} seconds")
+
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, shutting down after the current cycle")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    config = Config()
+    if config.engine == "async":
+        # The daemon keeps the sync clients and their connection pools alive between cycles
+        logger.warning("The daemon only supports the sync engine, ignoring engine: async")
+    clients = build_clients(config)
+    state = StateStore(config.state_file) if config.state_file else None
+    plex_clients = build_plex_clients(config)
+
+    metrics_server = metrics.serve(config.metrics_host, config.metrics_port) if config.metrics_port else None
+
+    # Scheduled runs and webhook batches share the clients, so only one may work at a time
+    run_lock = threading.Lock()
+
+    def process_scrobbles(watched_media: dict[str, WatchedMedia]) -> None:
+        with run_lock:
+            process_media(
+                config.libraries,
+                clients,
+                config.dry_run,
+                watched_media,
+                config.ignored_tmdb_ids,
+                config.ignored_tvdb_ids,
+                config.parallel,
+                state,
+                # A batch only holds the scrobbled items, plays without a webhook are left to the scheduled run
+                record_high_water_mark=False,
+            )
+
+    webhook_server = None
+    if config.webhook_port and len(plex_clients) > 1:
+        # Scrobbles only carry a rating key, which can't be told apart between servers
+        logger.warning("The webhook listener only supports a single Plex server, not starting it")
+    elif config.webhook_port:
+        plex = next(iter(plex_clients.values()))
+        try:
+            server_uuid = plex.get_machine_identifier()
+        except Exception as e:
+            logger.error(f"Could not get the Plex server ID, not starting the webhook listener: {e}")
+        else:
+            batcher = ScrobbleBatcher(plex, process_scrobbles, config.webhook_debounce)
+            webhook_server = WebhookServer(
+                config.webhook_host,
+                config.webhook_port,
+                config.libraries.keys(),
+                batcher,
+                server_uuid,
+                config.webhook_account_ids,
+            )
+            webhook_server.start()
+
+    try:
+        while not stop.is_set():
+            started = time.monotonic()
+            with run_lock:
+                for client in clients.values():
+                    client.expire_cache(config.cache_ttl)
+
+                try:
+                    with Profiler(profiling_requested(config.profile), top_n=config.profile_top) as profiler:
+                        run(config, plex_clients, clients, state, profiler)
+                except Exception as e:
+                    logger.exception(f"Run failed: {e}")
+
+            logger.debug(f"Cycle finished in {time.monotonic() - started:.1f}s")
+            stop.wait(max(0.0, schedule - (time.monotonic() - started)))
+    finally:
+        if webhook_server:
+            webhook_server.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+        for client in [*plex_clients.values(), *clients.values()]:
+            client.close()
+        if state:
+            state.close()
+        logger.info("Plex Unmonitorr daemon stopped")
+
+
+if __name__ == "__main__":
+    main()
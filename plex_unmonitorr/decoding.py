@@ -0,0 +1,105 @@
+import json
+import logging
+from typing import Any, NotRequired, TypedDict
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+"""
+Response schemas listing only the fields Plex Unmonitorr reads.
+
+With msgspec installed, responses are decoded straight from bytes into these shapes and every other
+field is skipped without being materialized. Without it, or if a response doesn't fit its schema,
+the stdlib `json` module decodes the full response, which the rest of the code handles the same way.
+"""
+
+logger = logging.getLogger("decoding")
+
+
+class PlexGuid(TypedDict):
+    id: NotRequired[str]
+
+
+class PlexPart(TypedDict):
+    file: NotRequired[str]
+
+
+class PlexMedia(TypedDict):
+    Part: NotRequired[list[PlexPart]]
+
+
+class PlexItem(TypedDict):
+    ratingKey: NotRequired[str | int]
+    guid: NotRequired[str]
+    grandparentTitle: NotRequired[str]
+    title: NotRequired[str]
+    type: NotRequired[str]
+    viewCount: NotRequired[int]
+    lastViewedAt: NotRequired[int]
+    parentIndex: NotRequired[int]
+    index: NotRequired[int]
+    Guid: NotRequired[list[PlexGuid]]
+    Media: NotRequired[list[PlexMedia]]
+    # Watch history entries only
+    viewedAt: NotRequired[int]
+    librarySectionID: NotRequired[str | int]
+
+
+class PlexContainer(TypedDict):
+    size: NotRequired[int]
+    totalSize: NotRequired[int]
+    Metadata: NotRequired[list[PlexItem]]
+
+
+class PlexLibraryContent(TypedDict):
+    MediaContainer: NotRequired[PlexContainer]
+
+
+class SonarrSeries(TypedDict):
+    id: int
+    title: NotRequired[str]
+    tvdbId: NotRequired[int]
+    statistics: NotRequired[dict[str, Any]]
+    lastAired: NotRequired[str]
+    previousAiring: NotRequired[str]
+    nextAiring: NotRequired[str]
+
+
+class SonarrEpisode(TypedDict):
+    id: int
+    seasonNumber: int
+    episodeNumber: int
+    monitored: NotRequired[bool]
+
+
+class RadarrMovie(TypedDict):
+    id: int
+    title: NotRequired[str]
+    tmdbId: NotRequired[int]
+    monitored: NotRequired[bool]
+
+
+LIBRARY_CONTENT = PlexLibraryContent
+SERIES_LIST = list[SonarrSeries]
+EPISODE_LIST = list[SonarrEpisode]
+MOVIE_LIST = list[RadarrMovie]
+
+_decoders = {}
+
+
+def _get_decoder(schema: Any) -> "msgspec.json.Decoder":
+    if schema not in _decoders:
+        _decoders[schema] = msgspec.json.Decoder(schema)
+    return _decoders[schema]
+
+
+def decode(content: bytes, schema: Any = None) -> Any:
+    """Decode a JSON response body, using the fast typed decoder for `schema` when available."""
+    if schema is not None and msgspec is not None:
+        try:
+            return _get_decoder(schema).decode(content)
+        except msgspec.ValidationError as e:
+            logger.debug(f"Response doesn't match {schema}, falling back to json: {e}")
+    return json.loads(content)
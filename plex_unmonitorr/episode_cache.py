@@ -0,0 +1,116 @@
+import gzip
+import json
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger("episode_cache")
+
+DEFAULT_MAX_EPISODES = 100_000
+
+# Only the episode fields used for matching are kept, which keeps cached lists small
+EPISODE_FIELDS = ("id", "seasonNumber", "episodeNumber", "monitored")
+
+# Series fields that change whenever the episode list does
+FINGERPRINT_FIELDS = ("statistics", "lastAired", "previousAiring", "nextAiring")
+
+
+def series_fingerprint(series: dict[str, Any]) -> str:
+    return json.dumps([series.get(key) for key in FINGERPRINT_FIELDS], sort_keys=True, default=str)
+
+
+def apply_monitored(episode_lists: Iterable[list[dict[str, Any]]], episode_ids: list[int], monitored: bool) -> None:
+    """Set the monitored flag of the given episodes in place"""
+    updated = set(episode_ids)
+    for episodes in episode_lists:
+        for ep in episodes:
+            if ep["id"] in updated:
+                ep["monitored"] = monitored
+
+
+class EpisodeCache:
+    """
+    LRU cache of Sonarr episode lists keyed by series ID.
+
+    Entries are invalidated when the series fingerprint from the series listing changes, and the least
+    recently used series are evicted once the cache holds more than `max_episodes` episodes. When `path`
+    is set the cache is persisted between runs.
+    """
+
+    def __init__(self, max_episodes: int = DEFAULT_MAX_EPISODES, path: str | Path | None = None):
+        self.max_episodes = max_episodes
+        self.path = Path(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, tuple[str, list[dict[str, Any]]]] = OrderedDict()
+        self._size = 0
+
+    def get(self, series_id: int, fingerprint: str) -> list[dict[str, Any]] | None:
+        with self._lock:
+            entry = self._entries.get(series_id)
+            if entry is None or entry[0] != fingerprint:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(series_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, series_id: int, fingerprint: str, episodes: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Cache the episode list for a series and return the trimmed copy that was stored"""
+        trimmed = [{key: ep.get(key) for key in EPISODE_FIELDS} for ep in episodes]
+        with self._lock:
+            self._store(series_id, fingerprint, trimmed)
+        return trimmed
+
+    def _store(self, series_id: int, fingerprint: str, episodes: list[dict[str, Any]]) -> None:
+        if old := self._entries.pop(series_id, None):
+            self._size -= len(old[1])
+        self._entries[series_id] = (fingerprint, episodes)
+        self._size += len(episodes)
+
+        while self._size > self.max_episodes and len(self._entries) > 1:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def update_monitored(self, episode_ids: list[int], monitored: bool) -> None:
+        """Apply a monitor change to cached episodes so they stay in step with Sonarr"""
+        with self._lock:
+            apply_monitored((episodes for _, episodes in self._entries.values()), episode_ids, monitored)
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> None:
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as file:
+                entries = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable episode cache {self.path}: {e}")
+            return
+
+        with self._lock:
+            for series_id, fingerprint, episodes in entries:
+                self._store(series_id, fingerprint, episodes)
+        logger.debug(f"Loaded {len(self._entries)} cached episode lists from {self.path}")
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            entries = [
+                [series_id, fingerprint, episodes] for series_id, (fingerprint, episodes) in self._entries.items()
+            ]
+
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            json.dump(entries, file)
+        tmp_path.replace(self.path)
+        logger.debug(f"Saved {len(entries)} cached episode lists to {self.path}")
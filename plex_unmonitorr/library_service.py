@@ -1,7 +1,28 @@
-from dataclasses import dataclass
+import json
+import logging
+import re
+import sys
+import zlib
+from collections import Counter
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
 from datetime import UTC, datetime, timedelta
 
-from plex_unmonitorr.plex_client import MEDIA_TYPE, PlexClient
+from plex_unmonitorr.metrics import metrics
+from plex_unmonitorr.plex_client import DEFAULT_PAGE_SIZE, MEDIA_TYPE, PlexClient
+from plex_unmonitorr.state_store import StateStore
+
+logger = logging.getLogger("library_service")
+
+TVDB_PATH_PATTERN = re.compile(r"\{tvdb-(\d+)\}")
+
+# Rating keys resolved per metadata request in history mode
+METADATA_BATCH_SIZE = 100
+
+
+# Section attributes Plex bumps when a library's content or metadata changes
+CHANGE_MARKERS = ("updatedAt", "scannedAt", "contentChangedAt")
 
 
 @dataclass
@@ -9,30 +30,40 @@ class Library:
     id: str
     title: str
     type: str
+    change_markers: tuple[int | None, ...] = ()
+    # Name of the Plex server the library belongs to, only set when several servers are configured
+    server: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class Media:
-    guid: str
     parent_title: str
     title: str
     type: str
     watched: bool
     view_count: int
     last_watched: int | None
-    files: list[str]
-    ids: list[str]
     season_number: int | None = None
     episode_number: int | None = None
+    rating_key: str = ""
+    # Numeric TVDB/TMDB IDs, resolved and interned at parse time
+    tvdb_id: str | None = None
+    tmdb_id: str | None = None
+    # Only used for debug logging, and left empty when details aren't retained
+    guid: str = ""
+    files: tuple[str, ...] = ()
+    ids: tuple[str, ...] = ()
 
 
 @dataclass
 class WatchedMedia:
     library: Library
     watched: list[Media]
+    # False if some items couldn't be fetched, so they must not be treated as handled
+    complete: bool = True
 
 
-def parse_libraries(data: dict, enabled_libraries: list[str]) -> list[Library]:
+def parse_libraries(data: dict, enabled_libraries: list[str], server: str = "") -> list[Library]:
     libraries = []
     for item in data.get("MediaContainer", {}).get("Directory", []):
         if item.get("title", "") not in enabled_libraries:
@@ -41,41 +72,426 @@ def parse_libraries(data: dict, enabled_libraries: list[str]) -> list[Library]:
             id=item.get("key", ""),
             title=item.get("title", ""),
             type=item.get("type", ""),
+            change_markers=tuple(item.get(marker) for marker in CHANGE_MARKERS),
+            server=server,
         )
         libraries.append(library)
     return libraries
 
 
-def parse_library_content(data: dict) -> list[Media]:
+def extract_tvdb_id_from_filepath(filepath: str) -> str | None:
+    """Extract TVDB ID from filepath pattern like {tvdb-123456}"""
+    match = TVDB_PATH_PATTERN.search(filepath)
+    return match.group(1) if match else None
+
+
+def extract_ids(files: list[str], ids: list[str]) -> tuple[str | None, str | None]:
+    """Get the numeric TVDB and TMDB IDs of an item, preferring a TVDB ID in the file path over Plex metadata."""
+    tvdb_id = None
+    for file_path in files:
+        tvdb_id = extract_tvdb_id_from_filepath(file_path)
+        if tvdb_id:
+            break
+
+    tmdb_id = None
+    for id_str in ids:
+        if not tvdb_id and id_str.startswith("tvdb://"):
+            tvdb_id = id_str.split("tvdb://")[-1]
+        elif not tmdb_id and id_str.startswith("tmdb://"):
+            tmdb_id = id_str.split("tmdb://")[-1]
+
+    return tvdb_id, tmdb_id
+
+
+def parse_media_item(item: dict, retain_details: bool = True) -> Media:
+    """
+    Parse a Plex metadata item.
+
+    IDs and show titles are interned, so every episode of a show shares one copy. With `retain_details`
+    off, the guid, file paths, raw Plex IDs and episode titles, which only feed logging, are dropped.
+    """
+    files = [file for m in item.get("Media", []) for p in m.get("Part", []) if (file := p.get("file"))]
+    ids = [g.get("id") for g in item.get("Guid", []) if (g.get("id") is not None)]
+    tvdb_id, tmdb_id = extract_ids(files, ids)
+    is_episode = item.get("type") == "episode"
+
+    return Media(
+        parent_title=sys.intern(item.get("grandparentTitle", "")),
+        title=item.get("title", "") if retain_details or not is_episode else "",
+        type=sys.intern(item.get("type", "")),
+        view_count=item.get("viewCount", 0),
+        watched=item.get("viewCount", 0) > 0,
+        last_watched=item.get("lastViewedAt", 0),
+        season_number=item.get("parentIndex") if is_episode else None,
+        episode_number=item.get("index") if is_episode else None,
+        rating_key=str(item.get("ratingKey", "")),
+        tvdb_id=sys.intern(tvdb_id) if tvdb_id else None,
+        tmdb_id=sys.intern(tmdb_id) if tmdb_id else None,
+        guid=item.get("guid", "") if retain_details else "",
+        files=tuple(files) if retain_details else (),
+        ids=tuple(ids) if retain_details else (),
+    )
+
+
+def parse_library_content(data: dict, retain_details: bool = True) -> list[Media]:
     content = data.get("MediaContainer", {}).get("Metadata", [])
-    media_items = []
+    return [parse_media_item(item, retain_details) for item in content]
 
-    for item in content:
-        media = Media(
-            guid=item.get("guid", ""),
-            parent_title=item.get("grandparentTitle", ""),
-            title=item.get("title", ""),
-            type=item.get("type", ""),
-            view_count=item.get("viewCount", 0),
-            watched=item.get("viewCount", 0) > 0,
-            last_watched=item.get("lastViewedAt", 0),
-            files=[],
-            ids=[g.get("id") for g in item.get("Guid", []) if (g.get("id") is not None)],
-            season_number=item.get("parentIndex") if item.get("type") == "episode" else None,
-            episode_number=item.get("index") if item.get("type") == "episode" else None,
+
+def get_media_type(library: Library) -> MEDIA_TYPE:
+    if library.type == "show":
+        return MEDIA_TYPE.EPISODE
+    elif library.type == "movie":
+        return MEDIA_TYPE.MOVIE
+    else:
+        raise ValueError(f"Unsupported library type: {library.type}")
+
+
+def get_library_cutoff(
+    library: Library, last_watched_cutoff: int | None, state: StateStore | None = None
+) -> tuple[int | None, set[str]]:
+    """Get the effective last-watched cutoff for a library and the rating keys an earlier run already handled."""
+    handled = set()
+    if state:
+        high_water_mark = state.get_high_water_mark(library.title)
+        if high_water_mark is not None and (last_watched_cutoff is None or high_water_mark > last_watched_cutoff):
+            last_watched_cutoff = high_water_mark
+        handled = state.get_handled_media(library.title)
+        if library.server:
+            # Rating keys are only unique per server, so they are recorded as `<server>:<rating key>`
+            prefix = f"{library.server}:"
+            handled = {key.removeprefix(prefix) for key in handled if key.startswith(prefix)}
+    return last_watched_cutoff, handled
+
+
+def filter_watched(media: Iterable[Media], last_watched_cutoff: int | None, handled: set[str]) -> list[Media]:
+    return [
+        m
+        for m in media
+        if m.watched
+        and (last_watched_cutoff is None or m.last_watched > last_watched_cutoff)
+        and m.rating_key not in handled
+    ]
+
+
+def collect_history_keys(pages: Iterable[dict], library: Library, handled: set[str]) -> list[str]:
+    """Get the distinct rating keys played in a library from pages of its watch history, newest first."""
+    seen = set(handled)
+    rating_keys = []
+    for page in pages:
+        for entry in page.get("MediaContainer", {}).get("Metadata", []):
+            rating_key = str(entry.get("ratingKey", ""))
+            # Older servers may ignore the section filter
+            section = entry.get("librarySectionID")
+            if not rating_key or rating_key in seen or (section is not None and str(section) != library.id):
+                continue
+            seen.add(rating_key)
+            rating_keys.append(rating_key)
+    return rating_keys
+
+
+def get_history_watched(
+    plex: PlexClient,
+    library: Library,
+    last_watched_cutoff: int,
+    handled: set[str],
+    page_size: int | None,
+    retain_details: bool = True,
+) -> WatchedMedia:
+    """Get the items of a library played since the cutoff from the Plex watch history.
+
+    History entries only carry rating keys, so the played items are then fetched in batches to get their IDs.
+    The cost depends on the number of recent plays rather than on the size of the library.
+    """
+    pages = metrics.timed_iter(
+        plex.iter_history(library.id, last_watched_cutoff, page_size or DEFAULT_PAGE_SIZE), "plex_fetch", library.title
+    )
+    rating_keys = collect_history_keys(pages, library, handled)
+
+    watched = []
+    for start in range(0, len(rating_keys), METADATA_BATCH_SIZE):
+        with metrics.stage("plex_fetch", library.title):
+            page = plex.get_metadata_items(rating_keys[start : start + METADATA_BATCH_SIZE])
+        with metrics.stage("parse", library.title):
+            watched.extend(filter_watched(parse_library_content(page, retain_details), last_watched_cutoff, handled))
+
+    return WatchedMedia(library=library, watched=watched)
+
+
+MEDIA_FIELDS = tuple(field.name for field in fields(Media))
+
+
+def encode_watched(media: list[Media]) -> bytes:
+    return zlib.compress(json.dumps([[getattr(m, name) for name in MEDIA_FIELDS] for m in media]).encode())
+
+
+def decode_watched(data: bytes) -> list[Media]:
+    media = []
+    for row in json.loads(zlib.decompress(data)):
+        item = Media(**dict(zip(MEDIA_FIELDS, row, strict=True)))
+        item.parent_title = sys.intern(item.parent_title)
+        item.type = sys.intern(item.type)
+        item.tvdb_id = sys.intern(item.tvdb_id) if item.tvdb_id else None
+        item.tmdb_id = sys.intern(item.tmdb_id) if item.tmdb_id else None
+        item.files = tuple(item.files)
+        item.ids = tuple(item.ids)
+        media.append(item)
+    return media
+
+
+def library_fingerprint(library: Library, latest_watched: dict, retain_details: bool) -> str:
+    """Fingerprint a library by its section change markers and its play activity.
+
+    `latest_watched` is the page from `get_latest_watched`: a new play changes its newest item or that
+    item's `lastViewedAt`, and an item marked (un)watched or removed changes the watched count.
+    """
+    container = latest_watched.get("MediaContainer", {})
+    latest = (container.get("Metadata") or [{}])[0]
+    return json.dumps(
+        [
+            library.change_markers,
+            container.get("totalSize", container.get("size")),
+            latest.get("ratingKey"),
+            latest.get("lastViewedAt"),
+            retain_details,
+        ]
+    )
+
+
+def snapshot_key(library: Library) -> str:
+    return f"{library.server}:{library.title}" if library.server else library.title
+
+
+def get_unchanged_watched(
+    state: StateStore, library: Library, fingerprint: str, last_watched_cutoff: int | None, handled: set[str]
+) -> list[Media] | None:
+    """Reuse the watched set saved by an earlier run if the library hasn't changed since, else None.
+
+    The saved set is only reused if it was fetched with the same or an older cutoff, and is filtered
+    again so items handled since then, or now older than the cutoff, drop out.
+    """
+    snapshot = state.get_snapshot(snapshot_key(library))
+    if snapshot is None:
+        return None
+    saved_fingerprint, saved_cutoff, watched = snapshot
+    if saved_fingerprint != fingerprint:
+        return None
+    if saved_cutoff is not None and (last_watched_cutoff is None or last_watched_cutoff < saved_cutoff):
+        return None
+    media = filter_watched(decode_watched(watched), last_watched_cutoff, handled)
+    logger.debug(f"{library.title} is unchanged since the last run, reusing {len(media)} watched items")
+    return media
+
+
+def get_library_watched(
+    plex: PlexClient,
+    library: Library,
+    last_watched_cutoff: int | None,
+    page_size: int | None,
+    state: StateStore | None = None,
+    retain_details: bool = True,
+    from_history: bool = False,
+) -> WatchedMedia:
+    """Get watched content from a single Plex library, skipping anything an earlier run already handled.
+
+    With `from_history`, recent plays are read from the watch history instead of scanning the library. That
+    needs a cutoff, so the first run without `days_back` or an earlier high-water mark still scans.
+
+    With a state store, a library whose fingerprint matches the last run isn't fetched at all.
+    """
+    last_watched_cutoff, handled = get_library_cutoff(library, last_watched_cutoff, state)
+    if state is None:
+        return fetch_library_watched(
+            plex, library, last_watched_cutoff, handled, page_size, retain_details, from_history
+        )
+
+    with metrics.stage("plex_fetch", library.title):
+        fingerprint = library_fingerprint(
+            library, plex.get_latest_watched(library.id, get_media_type(library)), retain_details
         )
-        for m in item.get("Media", []):
-            for p in m.get("Part", []):
-                if file := p.get("file"):
-                    media.files.append(file)
+    watched = get_unchanged_watched(state, library, fingerprint, last_watched_cutoff, handled)
+    if watched is not None:
+        metrics.count("unchanged", library.title, len(watched))
+        return WatchedMedia(library=library, watched=watched)
+
+    result = fetch_library_watched(plex, library, last_watched_cutoff, handled, page_size, retain_details, from_history)
+    state.save_snapshot(snapshot_key(library), fingerprint, last_watched_cutoff, encode_watched(result.watched))
+    return result
+
+
+def fetch_library_watched(
+    plex: PlexClient,
+    library: Library,
+    last_watched_cutoff: int | None,
+    handled: set[str],
+    page_size: int | None,
+    retain_details: bool = True,
+    from_history: bool = False,
+) -> WatchedMedia:
+    """Fetch the items of a library watched since the cutoff, leaving out the `handled` rating keys."""
+    if from_history and last_watched_cutoff is not None:
+        return get_history_watched(plex, library, last_watched_cutoff, handled, page_size, retain_details)
+
+    media_type = get_media_type(library)
+
+    # Plex filters out unwatched items server-side; the check below still applies for servers that ignore it
+    filters = {"watched_only": True, "viewed_after": last_watched_cutoff}
+    if page_size:
+        pages = metrics.timed_iter(
+            plex.iter_library_content(library.id, media_type, page_size, **filters), "plex_fetch", library.title
+        )
+    else:
+        with metrics.stage("plex_fetch", library.title):
+            pages = [plex.get_library_content(library.id, media_type, **filters)]
+
+    watched = []
+    for page in pages:
+        with metrics.stage("parse", library.title):
+            media = parse_library_content(page, retain_details)
+            watched.extend(filter_watched(media, last_watched_cutoff, handled))
+
+    return WatchedMedia(library=library, watched=watched)
+
+
+def get_days_back_cutoff(days_back: int | None) -> int | None:
+    if days_back is None:
+        return None
+    return int((datetime.now(UTC) - timedelta(days=days_back)).timestamp())
 
-        media_items.append(media)
 
-    return media_items
+def collect_watched_content(
+    plex: PlexClient,
+    enabled_libraries: list[str],
+    days_back: int | None = None,
+    page_size: int | None = DEFAULT_PAGE_SIZE,
+    parallel: bool = False,
+    state: StateStore | None = None,
+    retain_details: bool = True,
+    from_history: bool = False,
+    server: str = "",
+) -> dict[str, WatchedMedia]:
+    """Get all watched content from specified Plex libraries using an existing client."""
+    last_watched_cutoff = get_days_back_cutoff(days_back)
+    libraries = parse_libraries(plex.get_libraries(), enabled_libraries, server)
+
+    if parallel and libraries:
+        with ThreadPoolExecutor(max_workers=len(libraries)) as executor:
+            results = list(
+                executor.map(
+                    lambda lib: get_library_watched(
+                        plex, lib, last_watched_cutoff, page_size, state, retain_details, from_history
+                    ),
+                    libraries,
+                )
+            )
+    else:
+        results = [
+            get_library_watched(plex, library, last_watched_cutoff, page_size, state, retain_details, from_history)
+            for library in libraries
+        ]
+
+    return {result.library.title: result for result in results}
+
+
+def media_identity(item: Media) -> tuple:
+    """What makes two Plex items the same Sonarr episode or Radarr movie, whichever server they are on."""
+    if item.type == "episode" and item.tvdb_id:
+        return ("episode", item.tvdb_id, item.season_number, item.episode_number)
+    if item.type == "movie" and item.tmdb_id:
+        return ("movie", item.tmdb_id)
+    # Without an ID it can't be matched to Sonarr/Radarr anyway, keep it as is
+    return ("rating_key", item.rating_key)
+
+
+def merge_watched_content(results: dict[str, dict[str, WatchedMedia]]) -> dict[str, WatchedMedia]:
+    """Merge the watched content of several Plex servers by library title.
+
+    Rating keys are prefixed with the server name so they stay unique, and an item watched on several
+    servers is kept once, with its most recent play, so each Sonarr episode or Radarr movie is only checked once.
+    """
+    merged: dict[str, WatchedMedia] = {}
+    seen: dict[str, dict[tuple, int]] = {}
+    totals: Counter[str] = Counter()
+    for server, watched_media in results.items():
+        for library_title, items in watched_media.items():
+            if library_title not in merged:
+                library = Library(id=items.library.id, title=library_title, type=items.library.type)
+                merged[library_title] = WatchedMedia(library=library, watched=[])
+                seen[library_title] = {}
+            elif items.library.type != merged[library_title].library.type:
+                logger.warning(
+                    f"Skipping {library_title} on {server}: it is a {items.library.type} library, "
+                    f"but a {merged[library_title].library.type} library on another server"
+                )
+                continue
+
+            watched = merged[library_title].watched
+            totals[library_title] += len(items.watched)
+            for item in items.watched:
+                item.rating_key = f"{server}:{item.rating_key}"
+                identity = media_identity(item)
+                index = seen[library_title].get(identity)
+                if index is None:
+                    seen[library_title][identity] = len(watched)
+                    watched.append(item)
+                elif (item.last_watched or 0) > (watched[index].last_watched or 0):
+                    watched[index] = item
+
+    for library_title, items in merged.items():
+        logger.debug(f"Merged {totals[library_title]} watched items in {library_title} into {len(items.watched)}")
+    return merged
+
+
+def collect_watched_from_servers(
+    plex_clients: dict[str, PlexClient],
+    enabled_libraries: list[str],
+    days_back: int | None = None,
+    page_size: int | None = DEFAULT_PAGE_SIZE,
+    parallel: bool = False,
+    state: StateStore | None = None,
+    retain_details: bool = True,
+    from_history: bool = False,
+) -> dict[str, WatchedMedia]:
+    """Get the watched content of every Plex server, fetched concurrently, merged by library title.
+
+    With a single server this is just `collect_watched_content`. If any server fails the whole fetch does,
+    since the libraries share one high-water mark and skipping a server would lose its plays.
+    """
+    if len(plex_clients) == 1:
+        plex = next(iter(plex_clients.values()))
+        return collect_watched_content(
+            plex, enabled_libraries, days_back, page_size, parallel, state, retain_details, from_history
+        )
+
+    with ThreadPoolExecutor(max_workers=len(plex_clients)) as executor:
+        futures = {
+            server: executor.submit(
+                collect_watched_content,
+                plex,
+                enabled_libraries,
+                days_back,
+                page_size,
+                parallel,
+                state,
+                retain_details,
+                from_history,
+                server,
+            )
+            for server, plex in plex_clients.items()
+        }
+        return merge_watched_content({server: future.result() for server, future in futures.items()})
 
 
 def get_watched_content(
-    plex_url: str, plex_token: str, enabled_libraries: list[str], days_back: int | None = None
+    plex_url: str,
+    plex_token: str,
+    enabled_libraries: list[str],
+    days_back: int | None = None,
+    page_size: int | None = DEFAULT_PAGE_SIZE,
+    parallel: bool = False,
+    state: StateStore | None = None,
+    retain_details: bool = True,
+    from_history: bool = False,
 ) -> dict[str, list[WatchedMedia]]:
     """
     Get all watched content from specified Plex libraries.
@@ -85,36 +501,16 @@ def get_watched_content(
         plex_token: Plex authentication token
         enabled_libraries: List of library names to process
         days_back: Optional number of days to look back for watched content
+        page_size: Number of items to request per page, or None to fetch each library in a single request
+        parallel: Fetch all libraries concurrently instead of one at a time
+        state: Optional state store used to only fetch items that changed since the last run
+        retain_details: Keep titles, paths and raw IDs that are only used for logging
+        from_history: Read recent plays from the Plex watch history instead of scanning libraries
 
     Returns:
         Dictionary mapping library names to lists of watched media items
     """
-    last_watched_cutoff = None
-    if days_back is not None:
-        last_watched_cutoff = int((datetime.now(UTC) - timedelta(days=days_back)).timestamp())
-
     with PlexClient(plex_url, plex_token) as plex:
-        libraries = parse_libraries(plex.get_libraries(), enabled_libraries)
-        watched_media = {}
-
-        for library in libraries:
-            if library.type == "show":
-                media_type = MEDIA_TYPE.EPISODE
-            elif library.type == "movie":
-                media_type = MEDIA_TYPE.MOVIE
-            else:
-                raise ValueError(f"Unsupported library type: {library.type}")
-
-            content = plex.get_library_content(library.id, media_type)
-            media = parse_library_content(content)
-
-            watched_media[library.title] = WatchedMedia(
-                library=library,
-                watched=[
-                    m
-                    for m in media
-                    if m.watched and (last_watched_cutoff is None or m.last_watched > last_watched_cutoff)
-                ],
-            )
-
-    return watched_media
+        return collect_watched_content(
+            plex, enabled_libraries, days_back, page_size, parallel, state, retain_details, from_history
+        )
@@ -0,0 +1,65 @@
+import threading
+from collections.abc import Callable, Hashable, Iterable, Iterator
+from typing import Any
+
+
+class LookupRegistry:
+    """
+    Per-run memo of lookups shared by every library that uses the same client.
+
+    Only keys announced with `share` (e.g. the TVDB IDs of shows watched in more than one library) are
+    kept, so the registry never holds more than the lookups a later library will ask for again. Concurrent
+    requests for the same key wait for the first one instead of fetching it twice. Call `clear` once the
+    run is done.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._shared: set[Hashable] = set()
+        self._values: dict[Hashable, Any] = {}
+        self._loading: dict[Hashable, threading.Lock] = {}
+
+    def share(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            self._shared.update(keys)
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            if key not in self._shared:
+                self.misses += 1
+                shared = False
+            else:
+                shared = True
+                key_lock = self._loading.setdefault(key, threading.Lock())
+
+        if not shared:
+            return load()
+
+        with key_lock:
+            with self._lock:
+                if key in self._values:
+                    self.hits += 1
+                    return self._values[key]
+            value = load()
+            with self._lock:
+                self._values[key] = value
+                self._loading.pop(key, None)
+                self.misses += 1
+            return value
+
+    def values(self) -> Iterator[Any]:
+        with self._lock:
+            return iter(list(self._values.values()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._shared.clear()
+            self._values.clear()
+            self._loading.clear()
+            self.hits = 0
+            self.misses = 0
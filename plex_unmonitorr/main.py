@@ -1,17 +1,131 @@
+import asyncio
 import logging
+import time
+from pathlib import Path
 
 from dotenv import load_dotenv
 
+from plex_unmonitorr.async_engine import run_async
+from plex_unmonitorr.capture import CaptureWriter, capture_run_info
 from plex_unmonitorr.config import Config
-from plex_unmonitorr.library_service import get_watched_content
+from plex_unmonitorr.episode_cache import DEFAULT_MAX_EPISODES, EpisodeCache
+from plex_unmonitorr.library_service import collect_watched_from_servers
 from plex_unmonitorr.logging_config import setup_logging
+from plex_unmonitorr.metrics import instrument_session, metrics
+from plex_unmonitorr.plan import ChangePlan
+from plex_unmonitorr.plex_client import PlexClient
 from plex_unmonitorr.process_media import process_media
-from plex_unmonitorr.radarr_client import RadarrClient
-from plex_unmonitorr.sonarr_client import SonarrClient
+from plex_unmonitorr.profiling import Profiler, profiling_requested
+from plex_unmonitorr.radarr_client import DEFAULT_BATCH_SIZE, RadarrClient
+from plex_unmonitorr.request_scheduler import DEFAULT_MAX_CONCURRENCY, DEFAULT_TARGET_LATENCY, RequestScheduler
+from plex_unmonitorr.resilience import request_options
+from plex_unmonitorr.sonarr_client import (
+    DEFAULT_BATCH_RETRIES,
+    DEFAULT_BATCH_WORKERS,
+    DEFAULT_EPISODE_BATCH_SIZE,
+    DEFAULT_MAX_WORKERS,
+    SonarrClient,
+)
+from plex_unmonitorr.state_store import StateStore
 
 logger = logging.getLogger()
 
 
+def build_clients(config: Config) -> dict[str, SonarrClient | RadarrClient]:
+    clients = {}
+    for client_name, client_config in config.clients_config.items():
+        scheduler = RequestScheduler(
+            max_concurrency=client_config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY),
+            target_latency=client_config.get("target_latency", DEFAULT_TARGET_LATENCY),
+            rate_limit=client_config.get("rate_limit"),
+        )
+        if client_config["type"] == "sonarr":
+            cache_path = Path(config.cache_dir) / f"episodes-{client_name}.json.gz" if config.cache_dir else None
+            episode_cache = EpisodeCache(client_config.get("episode_cache_size", DEFAULT_MAX_EPISODES), cache_path)
+            episode_cache.load()
+            clients[client_name] = SonarrClient(
+                client_config["url"],
+                client_config["api_key"],
+                max_workers=client_config.get("max_workers", DEFAULT_MAX_WORKERS),
+                episode_cache=episode_cache,
+                scheduler=scheduler,
+                batch_size=client_config.get("batch_size", DEFAULT_EPISODE_BATCH_SIZE),
+                batch_workers=client_config.get("batch_workers", DEFAULT_BATCH_WORKERS),
+                batch_retries=client_config.get("batch_retries", DEFAULT_BATCH_RETRIES),
+                **request_options(client_name, client_config),
+            )
+        elif client_config["type"] == "radarr":
+            clients[client_name] = RadarrClient(
+                client_config["url"],
+                client_config["api_key"],
+                batch_size=client_config.get("batch_size", DEFAULT_BATCH_SIZE),
+                scheduler=scheduler,
+                **request_options(client_name, client_config),
+            )
+        else:
+            raise ValueError(f"Unsupported client type: {client_config['type']}")
+        instrument_session(clients[client_name].session, client_name)
+    return clients
+
+
+def build_plex_clients(config: Config) -> dict[str, PlexClient]:
+    plex_clients = {}
+    for name, server in config.plex_servers.items():
+        plex_clients[name] = PlexClient(server["url"], server["token"], **request_options(name, server))
+        instrument_session(plex_clients[name].session, name)
+    return plex_clients
+
+
+def run(
+    config: Config,
+    plex_clients: dict[str, PlexClient],
+    clients: dict[str, SonarrClient | RadarrClient],
+    state: StateStore | None = None,
+    profiler: Profiler | None = None,
+) -> None:
+    profiler = profiler or Profiler()
+    plan = ChangePlan() if config.plan_file else None
+    metrics.reset()
+    logger.debug("Getting played media from Plex...")
+
+    with profiler.stage("fetch"):
+        watched_media = collect_watched_from_servers(
+            plex_clients,
+            config.libraries.keys(),
+            config.days_back,
+            config.page_size,
+            config.parallel,
+            state,
+            config.retain_media_details,
+            config.ingestion == "history",
+        )
+    with profiler.stage("process"):
+        process_media(
+            config.libraries,
+            clients,
+            config.dry_run,
+            watched_media,
+            config.ignored_tmdb_ids,
+            config.ignored_tvdb_ids,
+            config.parallel,
+            state,
+            plan,
+        )
+        if plan is not None:
+            plan.save(config.plan_file)
+
+    with profiler.stage("save"):
+        for client_name, client in clients.items():
+            if episode_cache := getattr(client, "episode_cache", None):
+                logger.info(
+                    f"Episode cache for {client_name}: {episode_cache.hits} hits, {episode_cache.misses} misses"
+                )
+                episode_cache.reset_stats()
+                episode_cache.save()
+
+        metrics.report(config.metrics_file, config.metrics_summary_file)
+
+
 def main():
     load_dotenv()
     setup_logging()
@@ -20,24 +134,36 @@ def main():
 
     config = Config()
 
-    clients = {}
-    for client_name, client_config in config.clients_config.items():
-        if client_config["type"] == "sonarr":
-            clients[client_name] = SonarrClient(client_config["url"], client_config["api_key"])
-        elif client_config["type"] == "radarr":
-            clients[client_name] = RadarrClient(client_config["url"], client_config["api_key"])
+    state = StateStore(config.state_file) if config.state_file else None
+
+    with Profiler(profiling_requested(config.profile), top_n=config.profile_top) as profiler:
+        if config.engine == "async":
+            if config.capture_dir:
+                logger.warning("Capturing traffic is only supported by the sync engine")
+            with profiler.stage("async_run"):
+                asyncio.run(run_async(config, state))
         else:
-            raise ValueError(f"Unsupported client type: {client_config['type']}")
+            with profiler.stage("setup"):
+                clients = build_clients(config)
+            plex_clients = build_plex_clients(config)
 
-    logger.debug("Getting played media from Plex...")
+            capture = None
+            if config.capture_dir:
+                capture_path = Path(config.capture_dir) / f"{time.strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+                capture = CaptureWriter(capture_path, capture_run_info(config))
+                for name, client in [*plex_clients.items(), *clients.items()]:
+                    capture.record_session(client.session, name)
 
-    watched_media = get_watched_content(config.plex_url, config.plex_token, config.libraries.keys(), config.days_back)
-    process_media(
-        config.libraries, clients, config.dry_run, watched_media, config.ignored_tmdb_ids, config.ignored_tvdb_ids
-    )
+            try:
+                run(config, plex_clients, clients, state, profiler)
+            finally:
+                if capture:
+                    capture.close()
+                for client in [*plex_clients.values(), *clients.values()]:
+                    client.close()
 
-    for client in clients.values():
-        client.close()
+    if state:
+        state.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,252 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("metrics")
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metrics:
+    """
+    Per-run instrumentation: stage wall times, request counters and latency histograms per client,
+    and item counts per library. Exposed as Prometheus text and as a JSON run summary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.stages: dict[tuple[str, str], float] = defaultdict(float)
+            self.items: dict[tuple[str, str], int] = defaultdict(int)
+            self.requests: dict[tuple[str, str, str], int] = defaultdict(int)
+            self.response_decoded_bytes: dict[str, int] = defaultdict(int)
+            self.request_errors: dict[str, int] = defaultdict(int)
+            self.latency_buckets: dict[str, list[int]] = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+            self.latency_sum: dict[str, float] = defaultdict(float)
+            self.latency_count: dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str, library: str = ""):
+        """Time a block of work, adding its wall time to the stage for the library"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, library, time.perf_counter() - started)
+
+    def add_stage_time(self, name: str, library: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[(name, library)] += seconds
+
+    def timed_iter(self, iterable: Iterable, name: str, library: str = "") -> Iterator:
+        """Yield from `iterable`, counting only the time spent producing items towards the stage"""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add_stage_time(name, library, time.perf_counter() - started)
+            yield item
+
+    def count(self, name: str, library: str, value: int = 1) -> None:
+        with self._lock:
+            self.items[(name, library)] += value
+
+    def observe_request(self, client: str, method: str, status: str, latency: float, size: int) -> None:
+        with self._lock:
+            self.requests[(client, method, status)] += 1
+            self.response_decoded_bytes[client] += size
+            if status == "error" or status.startswith("5") or status.startswith("4"):
+                self.request_errors[client] += 1
+            buckets = self.latency_buckets[client]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    buckets[i] += 1
+            self.latency_sum[client] += latency
+            self.latency_count[client] += 1
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP plex_unmonitorr_stage_seconds Wall time spent in each stage of the last run",
+                "# TYPE plex_unmonitorr_stage_seconds gauge",
+            ]
+            for (stage, library), seconds in sorted(self.stages.items()):
+                lines.append(f'plex_unmonitorr_stage_seconds{{stage="{stage}",library="{library}"}} {seconds:.6f}')
+
+            lines += [
+                "# HELP plex_unmonitorr_items Items scanned, matched and unmonitored in the last run",
+                "# TYPE plex_unmonitorr_items gauge",
+            ]
+            for (name, library), value in sorted(self.items.items()):
+                lines.append(f'plex_unmonitorr_items{{kind="{name}",library="{library}"}} {value}')
+
+            lines += [
+                "# HELP plex_unmonitorr_requests_total Requests sent to each client",
+                "# TYPE plex_unmonitorr_requests_total counter",
+            ]
+            for (client, method, status), value in sorted(self.requests.items()):
+                lines.append(
+                    f'plex_unmonitorr_requests_total{{client="{client}",method="{method}",status="{status}"}} {value}'
+                )
+
+            lines += [
+                "# HELP plex_unmonitorr_request_errors_total Failed requests to each client",
+                "# TYPE plex_unmonitorr_request_errors_total counter",
+            ]
+            for client, value in sorted(self.request_errors.items()):
+                lines.append(f'plex_unmonitorr_request_errors_total{{client="{client}"}} {value}')
+
+            lines += [
+                "# HELP plex_unmonitorr_response_decoded_bytes_total Decompressed response body bytes from each client",
+                "# TYPE plex_unmonitorr_response_decoded_bytes_total counter",
+            ]
+            for client, value in sorted(self.response_decoded_bytes.items()):
+                lines.append(f'plex_unmonitorr_response_decoded_bytes_total{{client="{client}"}} {value}')
+
+            lines += [
+                "# HELP plex_unmonitorr_request_seconds Request latency for each client",
+                "# TYPE plex_unmonitorr_request_seconds histogram",
+            ]
+            for client, buckets in sorted(self.latency_buckets.items()):
+                for bound, value in zip(LATENCY_BUCKETS, buckets, strict=True):
+                    lines.append(f'plex_unmonitorr_request_seconds_bucket{{client="{client}",le="{bound}"}} {value}')
+                count = self.latency_count[client]
+                lines.append(f'plex_unmonitorr_request_seconds_bucket{{client="{client}",le="+Inf"}} {count}')
+                lines.append(f'plex_unmonitorr_request_seconds_sum{{client="{client}"}} {self.latency_sum[client]:.6f}')
+                lines.append(f'plex_unmonitorr_request_seconds_count{{client="{client}"}} {count}')
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, Any]:
+        with self._lock:
+            stages = defaultdict(dict)
+            for (stage, library), seconds in self.stages.items():
+                stages[library or "all"][stage] = round(seconds, 3)
+
+            items = defaultdict(dict)
+            for (name, library), value in self.items.items():
+                items[library][name] = value
+
+            clients = defaultdict(lambda: {"requests": 0, "errors": 0, "decoded_bytes": 0, "latency_seconds": 0.0})
+            for (client, _, _), value in self.requests.items():
+                clients[client]["requests"] += value
+            for client in clients:
+                clients[client]["errors"] = self.request_errors[client]
+                clients[client]["decoded_bytes"] = self.response_decoded_bytes[client]
+                clients[client]["latency_seconds"] = round(self.latency_sum[client], 3)
+
+            return {
+                "started": self.started,
+                "duration_seconds": round(time.time() - self.started, 3),
+                "stages": dict(stages),
+                "items": dict(items),
+                "clients": dict(clients),
+            }
+
+    def write_prometheus(self, path: str | Path) -> None:
+        _write_atomic(Path(path), self.to_prometheus())
+
+    def write_summary(self, path: str | Path) -> None:
+        _write_atomic(Path(path), json.dumps(self.summary(), indent=2))
+
+    def report(self, prometheus_path: str | Path | None = None, summary_path: str | Path | None = None) -> None:
+        """Log the run summary and write it to the configured files"""
+        summary = self.summary()
+        logger.info(f"Run finished in {summary['duration_seconds']}s")
+        for client, client_summary in summary["clients"].items():
+            logger.debug(
+                f"{client}: {client_summary['requests']} requests, {client_summary['errors']} errors, "
+                f"{client_summary['decoded_bytes']} decoded bytes, {client_summary['latency_seconds']}s waiting"
+            )
+
+        if prometheus_path:
+            self.write_prometheus(prometheus_path)
+        if summary_path:
+            self.write_summary(summary_path)
+
+    def serve(self, host: str, port: int) -> ThreadingHTTPServer:
+        """Serve the Prometheus text on `/metrics` from a background thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    """Transport adapter that records every request a session sends against a client name"""
+
+    def __init__(self, client: str, registry: Metrics, **kwargs):
+        self.client = client
+        self.registry = registry
+        super().__init__(**kwargs)
+
+    def send(self, request: requests.PreparedRequest, *args, **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        try:
+            response = super().send(request, *args, **kwargs)
+            # Read the body here so the latency covers the whole transfer; its size is after decompression
+            size = len(response.content)
+        except requests.RequestException:
+            self.registry.observe_request(self.client, request.method, "error", time.perf_counter() - started, 0)
+            raise
+        self.registry.observe_request(
+            self.client, request.method, str(response.status_code), time.perf_counter() - started, size
+        )
+        return response
+
+
+def instrument_session(session: requests.Session, client: str, registry: Metrics | None = None) -> None:
+    """Replace the session's transport adapters with instrumented ones, keeping their pool size"""
+    registry = registry or metrics
+    pool_maxsize = session.get_adapter("http://")._pool_maxsize
+    adapter = InstrumentedAdapter(client, registry, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    path.parent.mkdir(exist_ok=True, parents=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(content, encoding="utf-8")
+    tmp_path.replace(path)
+
+
+# Shared registry for the process, reset at the start of every run
+metrics = Metrics()
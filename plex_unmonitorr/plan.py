@@ -0,0 +1,59 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+"""
+Change plans: the Sonarr episode IDs and Radarr movie IDs a run found to unmonitor, per client and library.
+
+A plan is written as JSON, for example:
+
+    {"version": 1, "created": 1760000000,
+     "clients": {"sonarr": {"type": "sonarr", "libraries": {"TV Shows": [101, 102]}},
+                 "radarr": {"type": "radarr", "libraries": {"Movies": [7]}}}}
+
+and can be applied later with `python -m plex_unmonitorr.apply`, which only talks to Sonarr/Radarr.
+"""
+
+logger = logging.getLogger("plan")
+
+PLAN_VERSION = 1
+
+
+@dataclass
+class ChangePlan:
+    created: int = field(default_factory=lambda: int(time.time()))
+    # Client name -> {"type": "sonarr" | "radarr", "libraries": {library title: [IDs to unmonitor]}}
+    clients: dict[str, dict[str, Any]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, client_name: str, client_type: str, library_title: str, item_ids: list[int]) -> None:
+        if not item_ids:
+            return
+        with self._lock:
+            client = self.clients.setdefault(client_name, {"type": client_type, "libraries": {}})
+            client["libraries"].setdefault(library_title, []).extend(item_ids)
+
+    def count(self) -> int:
+        return sum(len(ids) for client in self.clients.values() for ids in client["libraries"].values())
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with self._lock:
+            content = {"version": PLAN_VERSION, "created": self.created, "clients": self.clients}
+        tmp_path.write_text(json.dumps(content, separators=(",", ":")), encoding="utf-8")
+        tmp_path.replace(path)
+        logger.info(f"Wrote plan with {self.count()} items to unmonitor to {path}")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "ChangePlan":
+        with open(path, encoding="utf-8") as file:
+            content = json.load(file)
+        if content.get("version") != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version {content.get('version')} in {path}")
+        return cls(created=content["created"], clients=content["clients"])
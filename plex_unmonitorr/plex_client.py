@@ -1,9 +1,19 @@
+from collections.abc import Iterator
 from enum import Enum
 from typing import Any
 from urllib.parse import urljoin
 
 import requests
 
+from plex_unmonitorr.decoding import LIBRARY_CONTENT, decode
+from plex_unmonitorr.resilience import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_RETRIES,
+    CircuitBreaker,
+    send_with_retries,
+)
+
 """
 https://plexapi.dev/api-reference/
 """
@@ -16,10 +26,23 @@ class MEDIA_TYPE(Enum):
     EPISODE = 4
 
 
+DEFAULT_PAGE_SIZE = 1000
+
+
 class PlexClient:
-    def __init__(self, base_url: str, token: str):
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+        retries: int = DEFAULT_RETRIES,
+        breaker: CircuitBreaker | None = None,
+    ):
         self.base_url = base_url.rstrip("/")
         self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker
         self.session = requests.Session()
         self.session.headers.update(
             {
@@ -29,26 +52,133 @@ class PlexClient:
             }
         )
 
-    def _make_request(self, endpoint: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
+    def _make_request(self, endpoint: str, params: dict[str, Any] | None = None, schema: Any = None) -> dict[str, Any]:
         url = urljoin(self.base_url, endpoint)
-        response = self.session.get(url, params=params)
+        response = send_with_retries(
+            lambda: self.session.get(url, params=params, timeout=self.timeout), "GET", url, self.retries, self.breaker
+        )
         response.raise_for_status()
-        return response.json()
+        return decode(response.content, schema)
 
     def get_libraries(self) -> dict[str, Any]:
         return self._make_request("/library/sections")
 
-    def get_library_content(self, library_id: str, media_type: MEDIA_TYPE, limit: int = -1) -> dict[str, Any]:
-        """Get all content from a specific library"""
+    def get_machine_identifier(self) -> str:
+        """Get the server's unique ID, which webhooks send as `Server.uuid`"""
+        return self._make_request("/identity")["MediaContainer"]["machineIdentifier"]
+
+    @staticmethod
+    def _content_params(
+        media_type: MEDIA_TYPE, watched_only: bool = False, viewed_after: int | None = None
+    ) -> dict[str, Any]:
+        """Build library content query params, pushing watched filters down to Plex.
+
+        Plex filter operators are part of the key: `viewCount>>=0` means viewCount > 0.
+        """
+        params = {"type": media_type.value, "includeGuids": 1}
+        if watched_only:
+            params["viewCount>>"] = 0
+        if viewed_after is not None:
+            params["lastViewedAt>>"] = viewed_after
+        return params
+
+    @staticmethod
+    def _latest_watched_params(media_type: MEDIA_TYPE) -> dict[str, Any]:
+        return {
+            **PlexClient._content_params(media_type, watched_only=True),
+            "sort": "lastViewedAt:desc",
+            "X-Plex-Container-Start": 0,
+            "X-Plex-Container-Size": 1,
+        }
+
+    def get_latest_watched(self, library_id: str, media_type: MEDIA_TYPE) -> dict[str, Any]:
+        """Get the most recently watched item of a library; the container's `totalSize` counts every watched item"""
         return self._make_request(
             f"/library/sections/{library_id}/all",
-            params={
-                "type": media_type.value,
-                "X-Plex-Container-Size": limit if limit != -1 else None,
-                "includeGuids": 1,
-            },
+            params=self._latest_watched_params(media_type),
+            schema=LIBRARY_CONTENT,
         )
 
+    def get_metadata(self, rating_key: str) -> dict[str, Any]:
+        """Get a single item by its rating key"""
+        return self._make_request(f"/library/metadata/{rating_key}", params={"includeGuids": 1}, schema=LIBRARY_CONTENT)
+
+    def get_metadata_items(self, rating_keys: list[str]) -> dict[str, Any]:
+        """Get several items in one request; items that no longer exist are left out of the response"""
+        return self.get_metadata(",".join(rating_keys))
+
+    @staticmethod
+    def _history_params(library_id: str, viewed_after: int | None = None) -> dict[str, Any]:
+        params = {"librarySectionID": library_id, "sort": "viewedAt:desc"}
+        if viewed_after is not None:
+            params["viewedAt>>"] = viewed_after
+        return params
+
+    def iter_history(
+        self, library_id: str, viewed_after: int | None = None, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> Iterator[dict[str, Any]]:
+        """Get the play history of a library, newest first, one page at a time"""
+        return self._iter_pages(
+            "/status/sessions/history/all", self._history_params(library_id, viewed_after), page_size
+        )
+
+    def get_library_content(
+        self,
+        library_id: str,
+        media_type: MEDIA_TYPE,
+        limit: int = -1,
+        watched_only: bool = False,
+        viewed_after: int | None = None,
+    ) -> dict[str, Any]:
+        """Get all content from a specific library"""
+        params = self._content_params(media_type, watched_only, viewed_after)
+        params["X-Plex-Container-Size"] = limit if limit != -1 else None
+        return self._make_request(f"/library/sections/{library_id}/all", params=params, schema=LIBRARY_CONTENT)
+
+    def iter_library_content(
+        self,
+        library_id: str,
+        media_type: MEDIA_TYPE,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        watched_only: bool = False,
+        viewed_after: int | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Get content from a specific library one page at a time"""
+        return self._iter_pages(
+            f"/library/sections/{library_id}/all",
+            self._content_params(media_type, watched_only, viewed_after),
+            page_size,
+        )
+
+    @staticmethod
+    def _page_params(params: dict[str, Any], start: int, page_size: int) -> dict[str, Any]:
+        return {**params, "X-Plex-Container-Start": start, "X-Plex-Container-Size": page_size}
+
+    @staticmethod
+    def _next_page_start(page: dict[str, Any], start: int, page_size: int) -> int | None:
+        """Start of the page after `page`, or None once it was the last one"""
+        container = page.get("MediaContainer", {})
+        size = container.get("size", len(container.get("Metadata", [])))
+        total_size = container.get("totalSize")
+        start += size
+        if size == 0 or size < page_size or (total_size is not None and start >= total_size):
+            return None
+        return start
+
+    def _iter_pages(self, endpoint: str, params: dict[str, Any], page_size: int) -> Iterator[dict[str, Any]]:
+        start = 0
+        while True:
+            page = self._make_request(
+                endpoint,
+                params=self._page_params(params, start, page_size),
+                schema=LIBRARY_CONTENT,
+            )
+            yield page
+
+            start = self._next_page_start(page, start, page_size)
+            if start is None:
+                break
+
     def close(self):
         """Close the session"""
         self.session.close()
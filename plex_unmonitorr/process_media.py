@@ -1,32 +1,73 @@
 import logging
-import re
-from collections import defaultdict
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
 from plex_unmonitorr.library_service import Media, WatchedMedia
+from plex_unmonitorr.metrics import metrics
+from plex_unmonitorr.plan import ChangePlan
 from plex_unmonitorr.radarr_client import RadarrClient
+from plex_unmonitorr.resilience import CircuitOpenError
 from plex_unmonitorr.sonarr_client import SonarrClient
+from plex_unmonitorr.state_store import StateStore
 
 logger = logging.getLogger("process_media")
 
+# Seconds before the first retry of a failed Sonarr batch, doubled on every further attempt
+BATCH_RETRY_DELAY = 2.0
 
-def extract_tvdb_id_from_filepath(filepath: str) -> str | None:
-    """Extract TVDB ID from filepath pattern like {tvdb-123456}"""
-    match = re.search(r"\{tvdb-(\d+)\}", filepath)
-    return match.group(1) if match else None
 
+@dataclass
+class LibraryResult:
+    # Plex items that were fully dealt with and don't need to be looked at again
+    handled: list[Media] = field(default_factory=list)
+    # Plex items that couldn't be found in Sonarr/Radarr yet, looked at again on the next run
+    unmatched: list[Media] = field(default_factory=list)
+    # Sonarr episode IDs or Radarr movie IDs that were unmonitored
+    unmonitored: list[int] = field(default_factory=list)
+    # False if any item hit an error and should be retried on the next run
+    complete: bool = True
+    # Sonarr episode IDs or Radarr movie IDs that were found to need unmonitoring, even in a dry run
+    pending: list[int] = field(default_factory=list)
+
+
+@dataclass
+class LibraryChanges:
+    # Plex items behind each Sonarr episode / Radarr movie ID that should be unmonitored, in match order
+    pending: dict[int, list[Media]] = field(default_factory=dict)
+    # Plex items that hit an error while matching
+    failed: list[Media] = field(default_factory=list)
+    # Plex items without an ID to match on, or whose series, episode or movie isn't in Sonarr/Radarr
+    unmatched: list[Media] = field(default_factory=list)
+
+
+def build_result(media: list[Media], changes: LibraryChanges, unmonitored: list[int]) -> LibraryResult:
+    """Only matched items count as handled; failed and unmatched ones are left for a later run."""
+    skipped_keys = {item.rating_key for item in changes.failed}
+    skipped_keys.update(item.rating_key for item in changes.unmatched)
+    return LibraryResult(
+        handled=[item for item in media if item.rating_key not in skipped_keys],
+        unmatched=changes.unmatched,
+        unmonitored=unmonitored,
+        complete=not changes.failed,
+        pending=list(changes.pending),
+    )
+
+
+def get_episode_lookup(client: SonarrClient, series: dict) -> dict[tuple[int, int], dict]:
+    """Get all episodes for a series keyed by season/episode number."""
+    return build_episode_lookup(client.get_series_episodes(series))
 
-def process_show_library(
-    library_title: str,
-    media: list[Media],
-    client: SonarrClient,
-    dry_run: bool,
-    ignored_tvdb_ids: list[str] = None,
-) -> None:
-    """Process a show library and unmonitor watched episodes in Sonarr."""
-    if ignored_tvdb_ids is None:
-        ignored_tvdb_ids = []
 
-    # Group watched episodes by TVDB ID
+def build_episode_lookup(episodes: list[dict]) -> dict[tuple[int, int], dict]:
+    return {(ep["seasonNumber"], ep["episodeNumber"]): ep for ep in episodes}
+
+
+def group_shows_by_tvdb(
+    media: list[Media], ignored_tvdb_ids: list[str], unmatched: list[Media] | None = None
+) -> dict[str, list[Media]]:
+    """Group watched episodes by the TVDB ID of their show."""
     shows_by_tvdb = defaultdict(list)
 
     for item in media:
@@ -34,20 +75,7 @@ def process_show_library(
             f"{item.parent_title} - S{item.season_number:02d}E{item.episode_number:02d} - {item.title} (Last watched: {item.last_watched}) - {item.ids} - {item.files}"
         )
 
-        # Extract TVDB ID from filepath
-        tvdb_id = None
-        for file_path in item.files:
-            tvdb_id = extract_tvdb_id_from_filepath(file_path)
-            if tvdb_id:
-                break
-
-        # Also try from the IDs list
-        if not tvdb_id:
-            for id_str in item.ids:
-                if id_str.startswith("tvdb://"):
-                    tvdb_id = id_str.split("tvdb://")[-1]
-                    break
-
+        tvdb_id = item.tvdb_id
         if tvdb_id:
             if tvdb_id in ignored_tvdb_ids:
                 logger.debug(f"Skipping ignored TVDB ID: {tvdb_id} ({item.parent_title})")
@@ -55,159 +83,436 @@ def process_show_library(
             shows_by_tvdb[tvdb_id].append(item)
         else:
             logger.warning(f"Could not extract TVDB ID for: {item.parent_title} - {item.title}")
+            if unmatched is not None:
+                unmatched.append(item)
 
-    # Process each show
-    episodes_to_unmonitor = []
+    return shows_by_tvdb
 
+
+def match_series(
+    shows_by_tvdb: dict[str, list[Media]], series_index: dict[str, dict], unmatched: list[Media] | None = None
+) -> list[tuple[str, dict, list[Media]]]:
+    """Look up each show in the Sonarr series index, returning (TVDB ID, series, watched episodes) for matches."""
+    matched_series = []
     for tvdb_id, watched_episodes in shows_by_tvdb.items():
-        try:
-            logger.debug(f"Processing TVDB ID: {tvdb_id}")
+        logger.debug(f"Processing TVDB ID: {tvdb_id}")
+
+        series_data = series_index.get(tvdb_id)
+        if not series_data:
+            show_name = watched_episodes[0].parent_title if watched_episodes else "Unknown"
+            logger.warning(f"No series found in Sonarr for TVDB ID: {tvdb_id} ({show_name})")
+            if unmatched is not None:
+                unmatched.extend(watched_episodes)
+            continue
 
-            # Get series data from Sonarr
-            series_data = client.get_series(tvdb_id)
-            if not series_data:
-                show_name = watched_episodes[0].parent_title if watched_episodes else "Unknown"
-                logger.warning(f"No series found in Sonarr for TVDB ID: {tvdb_id} ({show_name})")
+        logger.debug(f"Found series: {series_data['title']} (ID: {series_data['id']})")
+        matched_series.append((tvdb_id, series_data, watched_episodes))
+    return matched_series
+
+
+def match_episodes(
+    series_title: str,
+    watched_episodes: list[Media],
+    sonarr_episodes: dict[tuple[int, int], dict],
+    handled_ids: set[int] | None = None,
+    unmatched: list[Media] | None = None,
+) -> list[tuple[int, Media]]:
+    """Find watched episodes that are still monitored, returning (Sonarr episode ID, Plex item) pairs."""
+    matches = []
+    for watched_ep in watched_episodes:
+        key = (watched_ep.season_number, watched_ep.episode_number)
+        if key in sonarr_episodes:
+            sonarr_ep = sonarr_episodes[key]
+            if sonarr_ep.get("monitored", False) and sonarr_ep["id"] not in (handled_ids or ()):
+                matches.append((sonarr_ep["id"], watched_ep))
+                logger.info(
+                    f"Will unmonitor: {series_title} - S{watched_ep.season_number:02d}E{watched_ep.episode_number:02d} - {watched_ep.title}"
+                )
+        else:
+            logger.warning(
+                f"Episode not found in Sonarr: {watched_ep.parent_title} S{watched_ep.season_number:02d}E{watched_ep.episode_number:02d}"
+            )
+            if unmatched is not None:
+                unmatched.append(watched_ep)
+    return matches
+
+
+def find_show_changes(
+    library_title: str,
+    media: list[Media],
+    client: SonarrClient,
+    ignored_tvdb_ids: list[str] = None,
+    handled_ids: set[int] | None = None,
+) -> LibraryChanges:
+    """Match watched episodes against Sonarr and find the ones that are still monitored."""
+    if ignored_tvdb_ids is None:
+        ignored_tvdb_ids = []
+
+    changes = LibraryChanges()
+    shows_by_tvdb = group_shows_by_tvdb(media, ignored_tvdb_ids, changes.unmatched)
+    if not shows_by_tvdb:
+        return changes
+
+    try:
+        series_index = client.get_series_index()
+    except Exception as e:
+        logger.error(f"Failed to get series from Sonarr for {library_title}: {e}")
+        changes.failed = list(media)
+        return changes
+
+    matched_series = match_series(shows_by_tvdb, series_index, changes.unmatched)
+
+    # Fetch episodes for all matched series in parallel, then match them in order
+    skipped = 0
+    with ThreadPoolExecutor(max_workers=client.max_workers) as executor:
+        lookups = [executor.submit(get_episode_lookup, client, series_data) for _, series_data, _ in matched_series]
+
+        for (tvdb_id, series_data, watched_episodes), lookup in zip(matched_series, lookups, strict=True):
+            try:
+                for episode_id, watched_ep in match_episodes(
+                    series_data["title"], watched_episodes, lookup.result(), handled_ids, changes.unmatched
+                ):
+                    changes.pending.setdefault(episode_id, []).append(watched_ep)
+            except CircuitOpenError:
+                # Sonarr is down: the remaining lookups fail immediately, report them once below
+                skipped += 1
+                changes.failed.extend(watched_episodes)
+            except Exception as e:
+                logger.error(f"Error processing TVDB ID {tvdb_id}: {e}")
+                changes.failed.extend(watched_episodes)
                 continue
 
-            series_id = series_data[0]["id"] if isinstance(series_data, list) else series_data["id"]
-            series_title = series_data[0]["title"] if isinstance(series_data, list) else series_data["title"]
-            logger.debug(f"Found series: {series_title} (ID: {series_id})")
-
-            # Get all episodes for this series
-            episodes_data = client.get_episodes(series_id)
-
-            # Create a lookup for episodes by season/episode number
-            sonarr_episodes = {}
-            for ep in episodes_data:
-                key = (ep["seasonNumber"], ep["episodeNumber"])
-                sonarr_episodes[key] = ep
-
-            # Find matching episodes that are monitored
-            for watched_ep in watched_episodes:
-                key = (watched_ep.season_number, watched_ep.episode_number)
-                if key in sonarr_episodes:
-                    sonarr_ep = sonarr_episodes[key]
-                    if sonarr_ep.get("monitored", False):
-                        episodes_to_unmonitor.append(sonarr_ep["id"])
-                        logger.info(
-                            f"Will unmonitor: {series_title} - S{watched_ep.season_number:02d}E{watched_ep.episode_number:02d} - {watched_ep.title}"
-                        )
-                else:
-                    logger.warning(
-                        f"Episode not found in Sonarr: {watched_ep.parent_title} S{watched_ep.season_number:02d}E{watched_ep.episode_number:02d}"
-                    )
+    if skipped:
+        logger.error(f"Skipped {skipped} series in {library_title} because Sonarr is unavailable")
+    return changes
 
+
+def batch_retry_delay(client: SonarrClient, episode_ids: list[int], attempt: int, error: Exception) -> float:
+    """Seconds to wait before retrying a failed episode batch; re-raises `error` once there's no point retrying."""
+    if isinstance(error, CircuitOpenError) or attempt == client.batch_retries:
+        raise error
+    delay = BATCH_RETRY_DELAY * 2**attempt
+    logger.warning(f"Updating {len(episode_ids)} episodes failed, retrying in {delay:.0f}s: {error}")
+    return delay
+
+
+def set_episode_monitor_with_retry(client: SonarrClient, episode_ids: list[int], monitored: bool) -> None:
+    """Send one batch of episodes to Sonarr, retrying it with exponential backoff."""
+    for attempt in range(client.batch_retries + 1):
+        try:
+            client.set_episode_monitor(episode_ids, monitored)
+            return
         except Exception as e:
-            logger.error(f"Error processing TVDB ID {tvdb_id}: {e}")
-            continue
+            time.sleep(batch_retry_delay(client, episode_ids, attempt, e))
 
-    # Batch unmonitor episodes
-    if episodes_to_unmonitor:
-        if dry_run:
-            logger.info(f"DRY RUN: Would unmonitor {len(episodes_to_unmonitor)} episodes in {library_title}")
-        else:
+
+def unmonitor_episodes(library_title: str, changes: LibraryChanges, client: SonarrClient, dry_run: bool) -> list[int]:
+    """Unmonitor the episodes found by `find_show_changes`, returning the IDs that were unmonitored.
+
+    Episodes are sent in batches of `client.batch_size`, `client.batch_workers` at a time, so one slow or
+    failing batch only holds back (and, after its retries, fails) its own episodes.
+    """
+    episodes_to_unmonitor = list(changes.pending)
+    if not episodes_to_unmonitor:
+        logger.debug(f"No episodes to unmonitor in {library_title}")
+        return []
+
+    if dry_run:
+        logger.info(f"DRY RUN: Would unmonitor {len(episodes_to_unmonitor)} episodes in {library_title}")
+        return []
+
+    batches = [
+        episodes_to_unmonitor[start : start + client.batch_size]
+        for start in range(0, len(episodes_to_unmonitor), client.batch_size)
+    ]
+    unmonitored = []
+    with ThreadPoolExecutor(max_workers=min(client.batch_workers, len(batches))) as executor:
+        futures = [executor.submit(set_episode_monitor_with_retry, client, batch, False) for batch in batches]
+
+        for number, (batch, future) in enumerate(zip(batches, futures, strict=True), start=1):
             try:
-                client.set_episode_monitor(episodes_to_unmonitor, False)
-                logger.info(f"Successfully unmonitored {len(episodes_to_unmonitor)} episodes in {library_title}")
+                future.result()
+                unmonitored.extend(batch)
+                if len(batches) > 1:
+                    logger.info(f"Unmonitored batch {number}/{len(batches)} ({len(batch)} episodes) in {library_title}")
             except Exception as e:
-                logger.error(f"Failed to unmonitor episodes in {library_title}: {e}")
-    else:
-        logger.debug(f"No episodes to unmonitor in {library_title}")
+                logger.error(
+                    f"Failed to unmonitor batch {number}/{len(batches)} ({len(batch)} episodes) in {library_title}: {e}"
+                )
+                for episode_id in batch:
+                    changes.failed.extend(changes.pending[episode_id])
 
+    if unmonitored:
+        logger.info(f"Successfully unmonitored {len(unmonitored)} episodes in {library_title}")
+    return unmonitored
 
-def process_movie_library(
+
+def process_show_library(
     library_title: str,
     media: list[Media],
-    client: RadarrClient,
+    client: SonarrClient,
     dry_run: bool,
-    ignored_tmdb_ids: list[str] = None,
-) -> None:
-    """Process a movie library and unmonitor watched movies in Radarr."""
-    if ignored_tmdb_ids is None:
-        ignored_tmdb_ids = []
-
-    movies_to_unmonitor = []
-
+    ignored_tvdb_ids: list[str] = None,
+    handled_ids: set[int] | None = None,
+) -> LibraryResult:
+    """Process a show library and unmonitor watched episodes in Sonarr.
+
+    Episode IDs in `handled_ids` were unmonitored by an earlier run and are left alone.
+    """
+    with metrics.stage("match", library_title):
+        changes = find_show_changes(library_title, media, client, ignored_tvdb_ids, handled_ids)
+    with metrics.stage("unmonitor", library_title):
+        unmonitored = unmonitor_episodes(library_title, changes, client, dry_run)
+
+    metrics.count("scanned", library_title, len(media))
+    metrics.count("matched", library_title, len(changes.pending))
+    metrics.count("unmonitored", library_title, len(unmonitored))
+    return build_result(media, changes, unmonitored)
+
+
+def group_movies_by_tmdb(
+    media: list[Media], ignored_tmdb_ids: list[str], unmatched: list[Media] | None = None
+) -> list[tuple[str, Media]]:
+    """Extract the numeric TMDB ID of each watched movie, returning (TMDB ID, Plex item) pairs."""
+    movies = []
     for item in media:
         logger.debug(f"{item.title} (Last watched: {item.last_watched}) - {item.ids} - {item.files}")
 
-        # Extract TMDB ID from the IDs list
-        tmdb_id = None
-        for id_str in item.ids:
-            if id_str.startswith("tmdb://"):
-                tmdb_id = id_str
-                break
-
+        tmdb_id = item.tmdb_id
         if not tmdb_id:
             logger.warning(f"Could not extract TMDB ID for movie: {item.title}")
+            if unmatched is not None:
+                unmatched.append(item)
             continue
 
-        # Extract numeric ID from tmdb:// format for comparison
-        tmdb_numeric_id = tmdb_id.split("tmdb://")[-1] if tmdb_id.startswith("tmdb://") else tmdb_id
-        if tmdb_numeric_id in ignored_tmdb_ids:
-            logger.debug(f"Skipping ignored TMDB ID: {tmdb_numeric_id} ({item.title})")
+        if tmdb_id in ignored_tmdb_ids:
+            logger.debug(f"Skipping ignored TMDB ID: {tmdb_id} ({item.title})")
             continue
 
-        try:
-            logger.debug(f"Processing TMDB ID: {tmdb_id}")
-
-            # Get movie data from Radarr
-            movie_data = client.get_movie(tmdb_id)
-            if not movie_data:
-                logger.warning(f"No movie found in Radarr for TMDB ID: {tmdb_id} ({item.title})")
-                continue
+        movies.append((tmdb_id, item))
+    return movies
+
+
+def match_movies(
+    movies: list[tuple[str, Media]],
+    movie_index: dict[str, dict],
+    handled_ids: set[int] | None = None,
+    unmatched: list[Media] | None = None,
+) -> dict[int, list[Media]]:
+    """Find watched movies that are still monitored, returning the Plex items for each Radarr movie ID."""
+    pending = defaultdict(list)
+    for tmdb_id, item in movies:
+        logger.debug(f"Processing TMDB ID: tmdb://{tmdb_id}")
+
+        # Look up movie data in the Radarr movie index
+        movie = movie_index.get(tmdb_id)
+        if not movie:
+            logger.warning(f"No movie found in Radarr for TMDB ID: tmdb://{tmdb_id} ({item.title})")
+            if unmatched is not None:
+                unmatched.append(item)
+            continue
 
-            movie = movie_data[0] if isinstance(movie_data, list) else movie_data
-            movie_title = movie.get("title", item.title)
-            logger.debug(f"Found movie: {movie_title} (ID: {movie['id']})")
+        movie_title = movie.get("title", item.title)
+        logger.debug(f"Found movie: {movie_title} (ID: {movie['id']})")
 
-            if movie.get("monitored", False):
-                movies_to_unmonitor.append(movie)
+        if movie.get("monitored", False) and movie["id"] not in (handled_ids or ()):
+            if movie["id"] not in pending:
                 logger.info(f"Will unmonitor: {movie_title}")
+            pending[movie["id"]].append(item)
+    return pending
 
+
+def find_movie_changes(
+    library_title: str,
+    media: list[Media],
+    client: RadarrClient,
+    ignored_tmdb_ids: list[str] = None,
+    handled_ids: set[int] | None = None,
+) -> LibraryChanges:
+    """Match watched movies against Radarr and find the ones that are still monitored."""
+    if ignored_tmdb_ids is None:
+        ignored_tmdb_ids = []
+
+    changes = LibraryChanges()
+    movies = group_movies_by_tmdb(media, ignored_tmdb_ids, changes.unmatched)
+    if not movies:
+        return changes
+
+    try:
+        movie_index = client.get_movie_index()
+    except Exception as e:
+        logger.error(f"Failed to get movies from Radarr for {library_title}: {e}")
+        changes.failed = list(media)
+        return changes
+
+    changes.pending = match_movies(movies, movie_index, handled_ids, changes.unmatched)
+    return changes
+
+
+def unmonitor_movies(library_title: str, changes: LibraryChanges, client: RadarrClient, dry_run: bool) -> list[int]:
+    """Unmonitor the movies found by `find_movie_changes` in batches, returning the IDs that were unmonitored."""
+    movies_to_unmonitor = list(changes.pending)
+    if not movies_to_unmonitor:
+        logger.debug(f"No movies to unmonitor in {library_title}")
+        return []
+
+    if dry_run:
+        logger.info(f"DRY RUN: Would unmonitor {len(movies_to_unmonitor)} movies in {library_title}")
+        return []
+
+    unmonitored = []
+    for start in range(0, len(movies_to_unmonitor), client.batch_size):
+        batch = movies_to_unmonitor[start : start + client.batch_size]
+        try:
+            client.set_movie_monitor(batch, False)
+            unmonitored.extend(batch)
         except Exception as e:
-            logger.error(f"Error processing TMDB ID {tmdb_id}: {e}")
-            continue
+            logger.error(f"Failed to unmonitor {len(batch)} movies in {library_title}: {e}")
+            for movie_id in batch:
+                changes.failed.extend(changes.pending[movie_id])
+    if unmonitored:
+        logger.info(f"Successfully unmonitored {len(unmonitored)} movies in {library_title}")
+    return unmonitored
 
-    # Batch unmonitor movies
-    if movies_to_unmonitor:
-        if dry_run:
-            logger.info(f"DRY RUN: Would unmonitor {len(movies_to_unmonitor)} movies in {library_title}")
-        else:
-            try:
-                for movie in movies_to_unmonitor:
-                    movie["monitored"] = False
-                    client.update_movie(movie["id"], movie)
-                logger.info(f"Successfully unmonitored {len(movies_to_unmonitor)} movies in {library_title}")
-            except Exception as e:
-                logger.error(f"Failed to unmonitor movies in {library_title}: {e}")
+
+def process_movie_library(
+    library_title: str,
+    media: list[Media],
+    client: RadarrClient,
+    dry_run: bool,
+    ignored_tmdb_ids: list[str] = None,
+    handled_ids: set[int] | None = None,
+) -> LibraryResult:
+    """Process a movie library and unmonitor watched movies in Radarr.
+
+    Movie IDs in `handled_ids` were unmonitored by an earlier run and are left alone.
+    """
+    with metrics.stage("match", library_title):
+        changes = find_movie_changes(library_title, media, client, ignored_tmdb_ids, handled_ids)
+    with metrics.stage("unmonitor", library_title):
+        unmonitored = unmonitor_movies(library_title, changes, client, dry_run)
+
+    metrics.count("scanned", library_title, len(media))
+    metrics.count("matched", library_title, len(changes.pending))
+    metrics.count("unmonitored", library_title, len(unmonitored))
+    return build_result(media, changes, unmonitored)
+
+
+def record_result(
+    state: StateStore,
+    library_title: str,
+    client_name: str,
+    items: WatchedMedia,
+    result: LibraryResult,
+    record_high_water_mark: bool = True,
+) -> None:
+    # Only advance the high-water mark once every item in the library has been dealt with
+    high_water_mark = None
+    if record_high_water_mark and result.complete and items.complete:
+        high_water_mark = max((item.last_watched or 0 for item in items.watched), default=None)
+        if result.unmatched:
+            # Stay below unmatched items, so they're fetched and matched again once Sonarr/Radarr has them
+            high_water_mark = min(high_water_mark, min(item.last_watched or 0 for item in result.unmatched) - 1)
+    state.record_library(
+        library_title,
+        client_name,
+        [item.rating_key for item in result.handled],
+        result.unmonitored,
+        high_water_mark,
+    )
+
+
+def process_library(
+    library_title: str,
+    items: WatchedMedia,
+    client: SonarrClient | RadarrClient,
+    dry_run: bool,
+    ignored_tmdb_ids: list[str] = None,
+    ignored_tvdb_ids: list[str] = None,
+    handled_ids: set[int] | None = None,
+) -> LibraryResult:
+    logger.debug(f"Library: {library_title}")
+
+    library = items.library
+    media = items.watched
+
+    if library.type == "show":
+        return process_show_library(library_title, media, client, dry_run, ignored_tvdb_ids, handled_ids)
+    elif library.type == "movie":
+        return process_movie_library(library_title, media, client, dry_run, ignored_tmdb_ids, handled_ids)
     else:
-        logger.debug(f"No movies to unmonitor in {library_title}")
+        raise ValueError(f"Unsupported library type: {library.type}")
+
+
+def find_shared_shows(client_libraries: list[tuple[str, WatchedMedia]]) -> set[str]:
+    """TVDB IDs of the shows watched in more than one of the given libraries."""
+    counts = Counter(
+        tvdb_id for _, items in client_libraries for tvdb_id in {item.tvdb_id for item in items.watched if item.tvdb_id}
+    )
+    return {tvdb_id for tvdb_id, count in counts.items() if count > 1}
 
 
 def process_media(
     libraries: dict[str, str],
-    clients: dict[str, SonarrClient],
+    clients: dict[str, SonarrClient | RadarrClient],
     dry_run: bool,
     watched_media: dict[str, WatchedMedia],
     ignored_tmdb_ids: list[str] = None,
     ignored_tvdb_ids: list[str] = None,
+    parallel: bool = False,
+    state: StateStore | None = None,
+    plan: ChangePlan | None = None,
+    record_high_water_mark: bool = True,
 ):
+    """Unmonitor the watched media in each library's client.
+
+    When `plan` is given, the IDs found to need unmonitoring are also added to it, so a dry run can be
+    reviewed and applied later without fetching everything again. Pass `record_high_water_mark=False` when
+    `watched_media` is only a subset of each library's plays (e.g. webhook batches), so the next full run
+    still looks at everything played since the last one.
+    """
+    # Group libraries by client so each client only ever works on one library at a time
+    libraries_by_client = defaultdict(list)
     for library_title, items in watched_media.items():
-        logger.debug(f"Library: {library_title}")
-
-        library = items.library
-        media = items.watched
-
-        client = clients.get(libraries.get(library_title, ""))
-        if not client:
+        client_name = libraries.get(library_title, "")
+        if client_name not in clients:
             logger.warning(f"No client configured for library: {library_title}")
             continue
+        libraries_by_client[client_name].append((library_title, items))
 
-        if library.type == "show":
-            process_show_library(library_title, media, client, dry_run, ignored_tvdb_ids)
-        elif library.type == "movie":
-            process_movie_library(library_title, media, client, dry_run, ignored_tmdb_ids)
-        else:
-            raise ValueError(f"Unsupported library type: {library.type}")
+    def process_client_libraries(client_name: str) -> None:
+        # Episode lists of shows watched in several of the client's libraries are fetched once and shared
+        lookups = getattr(clients[client_name], "lookups", None)
+        if lookups is not None:
+            lookups.share(find_shared_shows(libraries_by_client[client_name]))
+
+        try:
+            for library_title, items in libraries_by_client[client_name]:
+                # Leave the rest of this client's libraries for the next run instead of failing every request
+                breaker = getattr(clients[client_name], "breaker", None)
+                if breaker and breaker.is_open:
+                    logger.warning(f"Skipping library {library_title}: {client_name} is unavailable")
+                    continue
+                handled_ids = state.get_handled_items(client_name) if state else None
+                result = process_library(
+                    library_title, items, clients[client_name], dry_run, ignored_tmdb_ids, ignored_tvdb_ids, handled_ids
+                )
+                if plan is not None:
+                    client_type = "sonarr" if isinstance(clients[client_name], SonarrClient) else "radarr"
+                    plan.add(client_name, client_type, library_title, result.pending)
+                # Dry runs don't change anything, so there is nothing to remember
+                if state and not dry_run:
+                    record_result(state, library_title, client_name, items, result, record_high_water_mark)
+        finally:
+            if lookups is not None:
+                if lookups.hits:
+                    logger.debug(f"Reused {lookups.hits} episode lists across libraries for {client_name}")
+                lookups.clear()
+
+    if parallel and libraries_by_client:
+        with ThreadPoolExecutor(max_workers=len(libraries_by_client)) as executor:
+            for future in [executor.submit(process_client_libraries, name) for name in libraries_by_client]:
+                future.result()
+    else:
+        for client_name in libraries_by_client:
+            process_client_libraries(client_name)
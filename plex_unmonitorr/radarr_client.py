@@ -1,17 +1,45 @@
+import time
 from typing import Any
 from urllib.parse import urljoin
 
 import requests
 
+from plex_unmonitorr.decoding import MOVIE_LIST, decode
+from plex_unmonitorr.request_scheduler import RequestScheduler
+from plex_unmonitorr.resilience import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_RETRIES,
+    CircuitBreaker,
+    send_with_retries,
+)
+
 """
 https://radarr.video/docs/api/
 """
 
 
+DEFAULT_BATCH_SIZE = 100
+
+
 class RadarrClient:
-    def __init__(self, base_url: str, api_key: str):
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        scheduler: RequestScheduler | None = None,
+        timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+        retries: int = DEFAULT_RETRIES,
+        breaker: CircuitBreaker | None = None,
+    ):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
+        self.batch_size = batch_size
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker
         self.session = requests.Session()
         self.session.headers.update(
             {
@@ -20,6 +48,8 @@ class RadarrClient:
                 "Accept-Encoding": "gzip, br",
             }
         )
+        self._movie_index: dict[str, dict[str, Any]] | None = None
+        self._index_loaded_at = 0.0
 
     def _make_request(
         self,
@@ -27,11 +57,20 @@ class RadarrClient:
         method: str = "GET",
         params: dict[str, Any] | None = None,
         body: dict[str | Any] | None = None,
+        schema: Any = None,
     ) -> dict[str, Any]:
         url = urljoin(self.base_url, endpoint)
-        response = self.session.request(method, url, params=params, json=body)
+
+        def send() -> requests.Response:
+            if self.scheduler:
+                return self.scheduler.send(
+                    lambda: self.session.request(method, url, params=params, json=body, timeout=self.timeout)
+                )
+            return self.session.request(method, url, params=params, json=body, timeout=self.timeout)
+
+        response = send_with_retries(send, method, url, self.retries, self.breaker)
         response.raise_for_status()
-        return response.json()
+        return decode(response.content, schema)
 
     def get_movie(self, tmdb_id: str) -> dict[str, Any]:
         if tmdb_id.startswith("tmdb://"):
@@ -39,9 +78,38 @@ class RadarrClient:
 
         return self._make_request("/api/v3/movie", params={"tmdbId": tmdb_id})
 
+    def get_all_movies(self) -> list[dict[str, Any]]:
+        return self._make_request("/api/v3/movie", schema=MOVIE_LIST)
+
+    def get_movie_index(self) -> dict[str, dict[str, Any]]:
+        """Get all movies keyed by TMDB ID, fetched once and reused for the lifetime of the client"""
+        if self._movie_index is None:
+            self._index_loaded_at = time.monotonic()
+            self._movie_index = {str(movie["tmdbId"]): movie for movie in self.get_all_movies() if movie.get("tmdbId")}
+        return self._movie_index
+
     def update_movie(self, movie_id: int, movie_data: dict[str, Any]) -> None:
         return self._make_request(f"/api/v3/movie/{movie_id}", method="PUT", body=movie_data)
 
+    def set_movie_monitor(self, movie_ids: list[int], monitored: bool) -> None:
+        result = self._make_request(
+            "/api/v3/movie/editor", method="PUT", body={"movieIds": movie_ids, "monitored": monitored}
+        )
+
+        # Keep the cached index in step so later libraries see the new state
+        if self._movie_index is not None:
+            updated = set(movie_ids)
+            for movie in self._movie_index.values():
+                if movie["id"] in updated:
+                    movie["monitored"] = monitored
+
+        return result
+
+    def expire_cache(self, max_age: float = 0) -> None:
+        """Drop cached lookups older than `max_age` seconds so the next run fetches fresh data"""
+        if time.monotonic() - self._index_loaded_at >= max_age:
+            self._movie_index = None
+
     def close(self):
         """Close the session"""
         self.session.close()
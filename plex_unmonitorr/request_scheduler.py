@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+import requests
+
+logger = logging.getLogger("request_scheduler")
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TARGET_LATENCY = 2.0
+
+
+class TokenBucket:
+    """Caps the request rate at `rate` requests per second, allowing bursts of up to `burst` requests."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to the instance it protects (AIMD).
+
+    Every fast, successful request raises the limit by 1/limit, so it grows by roughly one per round of
+    requests. A slow request or an error halves it, at most once per `target_latency` so a burst of
+    failures from the same overload only backs off once.
+    """
+
+    def __init__(
+        self,
+        max_limit: int = DEFAULT_MAX_CONCURRENCY,
+        target_latency: float = DEFAULT_TARGET_LATENCY,
+        min_limit: int = 1,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.target_latency = target_latency
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float, error: bool) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if error or latency > self.target_latency:
+                if now - self._last_decrease > self.target_latency:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+                    logger.debug(f"Reduced concurrency limit to {int(self.limit)} (latency {latency:.2f}s)")
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """Runs requests against a single *arr instance through its concurrency limiter and optional rate cap."""
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        target_latency: float = DEFAULT_TARGET_LATENCY,
+        rate_limit: float | None = None,
+    ):
+        self.limiter = AdaptiveLimiter(max_concurrency, target_latency)
+        self.bucket = TokenBucket(rate_limit) if rate_limit else None
+
+    def send(self, request: Callable[[], requests.Response]) -> requests.Response:
+        if self.bucket:
+            self.bucket.acquire()
+
+        self.limiter.acquire()
+        started = time.monotonic()
+        error = True
+        try:
+            response = request()
+            error = response.status_code >= 500
+            return response
+        finally:
+            self.limiter.release(time.monotonic() - started, error)
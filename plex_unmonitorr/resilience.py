@@ -0,0 +1,141 @@
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+import requests
+
+logger = logging.getLogger("resilience")
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+# Extra attempts for GET requests; PUTs are never retried here
+DEFAULT_RETRIES = 2
+# Upper bound of the first retry delay in seconds, doubled on every further attempt
+RETRY_BACKOFF = 0.5
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIME = 60.0
+
+# Responses worth trying again; other errors won't change on a retry
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to an instance whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to an instance after `failure_threshold` consecutive failures.
+
+    While open, every request fails immediately with `CircuitOpenError`, so the rest of that instance's work
+    is skipped instead of waiting for one timeout after another. After `recovery_time` seconds a single trial
+    request is let through: if it succeeds the breaker closes again, otherwise it stays open for another
+    `recovery_time`. Exceptions raised while sending and 5xx responses count as failures.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        recovery_time: float = DEFAULT_RECOVERY_TIME,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.recovery_time
+
+    def before_request(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.recovery_time or self._trial_in_flight:
+                raise CircuitOpenError(f"{self.name} is unavailable, skipping request")
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"{self.name} is responding again")
+            self.failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or (self._opened_at is None and self.failures >= self.failure_threshold):
+                if self._opened_at is None:
+                    logger.error(
+                        f"{self.name} failed {self.failures} requests in a row, "
+                        f"skipping its requests for {self.recovery_time:.0f}s"
+                    )
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+def retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff, so clients that failed together don't retry together."""
+    return random.uniform(0, RETRY_BACKOFF * 2**attempt)
+
+
+def send_with_retries(
+    send: Callable[[], requests.Response],
+    method: str,
+    url: str,
+    retries: int = DEFAULT_RETRIES,
+    breaker: CircuitBreaker | None = None,
+) -> requests.Response:
+    """Send a request through the breaker, retrying GETs on connection errors, timeouts and `RETRY_STATUSES`."""
+    attempts = retries + 1 if method == "GET" else 1
+    for attempt in range(attempts):
+        if breaker:
+            breaker.before_request()
+        try:
+            response = send()
+        except Exception as e:
+            # Any error ends a trial request, so the breaker can't be left waiting on it
+            if breaker:
+                breaker.record_failure()
+            if not isinstance(e, (requests.ConnectionError, requests.Timeout)) or attempt == attempts - 1:
+                raise
+            error = str(e)
+        else:
+            if breaker:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                return response
+            error = f"HTTP {response.status_code}"
+
+        delay = retry_delay(attempt)
+        logger.debug(f"{method} {url} failed ({error}), retrying in {delay:.2f}s")
+        time.sleep(delay)
+
+
+def request_options(name: str, options: dict[str, Any]) -> dict[str, Any]:
+    """Timeout, retry and circuit breaker arguments for a client, from its section of the config."""
+    return {
+        "timeout": (
+            options.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+            options.get("read_timeout", DEFAULT_READ_TIMEOUT),
+        ),
+        "retries": options.get("retries", DEFAULT_RETRIES),
+        "breaker": CircuitBreaker(
+            name,
+            options.get("failure_threshold", DEFAULT_FAILURE_THRESHOLD),
+            options.get("recovery_time", DEFAULT_RECOVERY_TIME),
+        ),
+    }
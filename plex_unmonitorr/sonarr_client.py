@@ -1,18 +1,65 @@
+import time
 from typing import Any
 from urllib.parse import urljoin
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from plex_unmonitorr.decoding import EPISODE_LIST, SERIES_LIST, decode
+from plex_unmonitorr.episode_cache import EpisodeCache, apply_monitored, series_fingerprint
+from plex_unmonitorr.lookup_registry import LookupRegistry
+from plex_unmonitorr.request_scheduler import RequestScheduler
+from plex_unmonitorr.resilience import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_RETRIES,
+    CircuitBreaker,
+    send_with_retries,
+)
 
 """
 https://sonarr.tv/docs/api/
 """
 
 
+DEFAULT_MAX_WORKERS = 4
+# Episodes per bulk monitor request
+DEFAULT_EPISODE_BATCH_SIZE = 500
+DEFAULT_BATCH_WORKERS = 2
+DEFAULT_BATCH_RETRIES = 2
+
+
 class SonarrClient:
-    def __init__(self, base_url: str, api_key: str):
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        episode_cache: EpisodeCache | None = None,
+        scheduler: RequestScheduler | None = None,
+        timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+        retries: int = DEFAULT_RETRIES,
+        breaker: CircuitBreaker | None = None,
+        batch_size: int = DEFAULT_EPISODE_BATCH_SIZE,
+        batch_workers: int = DEFAULT_BATCH_WORKERS,
+        batch_retries: int = DEFAULT_BATCH_RETRIES,
+    ):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.batch_workers = batch_workers
+        self.batch_retries = batch_retries
+        self.episode_cache = episode_cache
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker
         self.session = requests.Session()
+        # Size the connection pool so parallel episode fetches don't discard connections
+        adapter = HTTPAdapter(pool_maxsize=max(max_workers, batch_workers, 10))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.session.headers.update(
             {
                 "X-Api-Key": self.api_key,
@@ -20,6 +67,10 @@ class SonarrClient:
                 "Accept-Encoding": "gzip, br",
             }
         )
+        self._series_index: dict[str, dict[str, Any]] | None = None
+        # Episode lists of shows watched in several libraries, shared between them for one run
+        self.lookups = LookupRegistry()
+        self._index_loaded_at = 0.0
 
     def _make_request(
         self,
@@ -27,11 +78,20 @@ class SonarrClient:
         method: str = "GET",
         params: dict[str, Any] | None = None,
         body: dict[str | Any] | None = None,
+        schema: Any = None,
     ) -> dict[str, Any]:
         url = urljoin(self.base_url, endpoint)
-        response = self.session.request(method, url, params=params, json=body)
+
+        def send() -> requests.Response:
+            if self.scheduler:
+                return self.scheduler.send(
+                    lambda: self.session.request(method, url, params=params, json=body, timeout=self.timeout)
+                )
+            return self.session.request(method, url, params=params, json=body, timeout=self.timeout)
+
+        response = send_with_retries(send, method, url, self.retries, self.breaker)
         response.raise_for_status()
-        return response.json()
+        return decode(response.content, schema)
 
     def get_series(self, tvdb_id: str) -> dict[str, Any]:
         if tvdb_id.startswith("tvdb://"):
@@ -39,13 +99,49 @@ class SonarrClient:
 
         return self._make_request("/api/v3/series", params={"tvdbId": tvdb_id})
 
+    def get_all_series(self) -> list[dict[str, Any]]:
+        return self._make_request("/api/v3/series", schema=SERIES_LIST)
+
+    def get_series_index(self) -> dict[str, dict[str, Any]]:
+        """Get all series keyed by TVDB ID, fetched once and reused for the lifetime of the client"""
+        if self._series_index is None:
+            self._index_loaded_at = time.monotonic()
+            self._series_index = {
+                str(series["tvdbId"]): series for series in self.get_all_series() if series.get("tvdbId")
+            }
+        return self._series_index
+
     def get_episodes(self, series_id: str) -> dict[str, Any]:
-        return self._make_request("/api/v3/episode", params={"seriesId": series_id})
+        return self._make_request("/api/v3/episode", params={"seriesId": series_id}, schema=EPISODE_LIST)
+
+    def get_series_episodes(self, series: dict[str, Any]) -> list[dict[str, Any]]:
+        """Get all episodes for a series, reusing a list another library fetched this run"""
+        return self.lookups.get(str(series.get("tvdbId")), lambda: self._load_series_episodes(series))
+
+    def _load_series_episodes(self, series: dict[str, Any]) -> list[dict[str, Any]]:
+        """Get all episodes for a series, reusing the cached list if the series hasn't changed since"""
+        if self.episode_cache is None:
+            return self.get_episodes(series["id"])
+
+        fingerprint = series_fingerprint(series)
+        episodes = self.episode_cache.get(series["id"], fingerprint)
+        if episodes is None:
+            episodes = self.episode_cache.put(series["id"], fingerprint, self.get_episodes(series["id"]))
+        return episodes
 
     def set_episode_monitor(self, episode_ids: list[int], monitored: bool) -> None:
-        return self._make_request(
+        result = self._make_request(
             "/api/v3/episode/monitor", method="PUT", body={"episodeIds": episode_ids, "monitored": monitored}
         )
+        if self.episode_cache is not None:
+            self.episode_cache.update_monitored(episode_ids, monitored)
+        apply_monitored(self.lookups.values(), episode_ids, monitored)
+        return result
+
+    def expire_cache(self, max_age: float = 0) -> None:
+        """Drop cached lookups older than `max_age` seconds so the next run fetches fresh data"""
+        if time.monotonic() - self._index_loaded_at >= max_age:
+            self._series_index = None
 
     def close(self):
         """Close the session"""
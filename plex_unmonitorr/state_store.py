@@ -0,0 +1,118 @@
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+logger = logging.getLogger("state_store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS handled_media (
+    library TEXT NOT NULL,
+    rating_key TEXT NOT NULL,
+    PRIMARY KEY (library, rating_key)
+);
+CREATE TABLE IF NOT EXISTS handled_items (
+    client TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    PRIMARY KEY (client, item_id)
+);
+CREATE TABLE IF NOT EXISTS library_marks (
+    library TEXT PRIMARY KEY,
+    last_viewed_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS library_snapshots (
+    library TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    last_viewed_cutoff INTEGER,
+    watched BLOB NOT NULL
+);
+"""
+
+
+class StateStore:
+    """
+    On-disk record of what earlier runs already handled, so later runs only process what changed.
+
+    Tracks the Plex rating keys handled per library, the Sonarr episode / Radarr movie IDs unmonitored
+    per client, a per-library high-water mark on `lastViewedAt`, and the last watched set fetched from
+    each library along with a fingerprint of the library at the time.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        # Libraries may be processed from several threads, so share one connection behind a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        logger.debug(f"Opened state store at {self.path}")
+
+    def get_high_water_mark(self, library: str) -> int | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_viewed_at FROM library_marks WHERE library = ?", (library,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_handled_media(self, library: str) -> set[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT rating_key FROM handled_media WHERE library = ?", (library,)).fetchall()
+        return {row[0] for row in rows}
+
+    def get_handled_items(self, client: str) -> set[int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT item_id FROM handled_items WHERE client = ?", (client,)).fetchall()
+        return {row[0] for row in rows}
+
+    def record_library(
+        self,
+        library: str,
+        client: str,
+        rating_keys: list[str],
+        item_ids: list[int],
+        high_water_mark: int | None = None,
+    ) -> None:
+        """Record the outcome of processing a library in a single transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO handled_media (library, rating_key) VALUES (?, ?)",
+                [(library, key) for key in rating_keys if key],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO handled_items (client, item_id) VALUES (?, ?)",
+                [(client, item_id) for item_id in item_ids],
+            )
+            if high_water_mark is not None:
+                self._conn.execute(
+                    "INSERT INTO library_marks (library, last_viewed_at) VALUES (?, ?) "
+                    "ON CONFLICT (library) DO UPDATE SET last_viewed_at = max(last_viewed_at, excluded.last_viewed_at)",
+                    (library, high_water_mark),
+                )
+        logger.debug(f"Recorded {len(rating_keys)} handled items and {len(item_ids)} unmonitored IDs for {library}")
+
+    def get_snapshot(self, library: str) -> tuple[str, int | None, bytes] | None:
+        """Get the fingerprint, cutoff and encoded watched set last saved for a library."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT fingerprint, last_viewed_cutoff, watched FROM library_snapshots WHERE library = ?", (library,)
+            ).fetchone()
+
+    def save_snapshot(self, library: str, fingerprint: str, last_viewed_cutoff: int | None, watched: bytes) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO library_snapshots (library, fingerprint, last_viewed_cutoff, watched) "
+                "VALUES (?, ?, ?, ?)",
+                (library, fingerprint, last_viewed_cutoff, watched),
+            )
+
+    def close(self):
+        """Close the database connection"""
+        self._conn.close()
+
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit"""
+        self.close()
@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+from collections import defaultdict
+from collections.abc import Callable
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from plex_unmonitorr.library_service import Library, WatchedMedia, filter_watched, parse_library_content
+from plex_unmonitorr.plex_client import PlexClient
+
+"""
+https://support.plex.tv/articles/115002267687-webhooks/
+"""
+
+logger = logging.getLogger("webhook_server")
+
+SCROBBLE_EVENT = "media.scrobble"
+
+# Plex sends webhooks for managed and shared users too; the server owner is local account 1
+OWNER_ACCOUNT_ID = 1
+
+
+def parse_webhook_payload(content_type: str, body: bytes) -> dict | None:
+    """Extract the JSON payload from a Plex webhook, which is sent as multipart/form-data."""
+    message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    if not message.is_multipart():
+        return None
+    for part in message.get_payload():
+        if part.get_param("name", header="content-disposition") == "payload":
+            return json.loads(part.get_payload(decode=True))
+    return None
+
+
+class ScrobbleBatcher:
+    """
+    Collects scrobbled items and processes them once no new events have arrived for `debounce` seconds,
+    so a binge session turns into one batch per library instead of one request per episode.
+    """
+
+    def __init__(
+        self,
+        plex: PlexClient,
+        process: Callable[[dict[str, WatchedMedia]], None],
+        debounce: float,
+    ):
+        self.plex = plex
+        self.process = process
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._pending: dict[tuple[str, str, str], set[str]] = defaultdict(set)
+        self._timer: threading.Timer | None = None
+
+    def add(self, library: Library, rating_key: str) -> None:
+        with self._lock:
+            self._pending[(library.id, library.title, library.type)].add(rating_key)
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(set)
+            self._timer = None
+
+        watched_media = {}
+        for (library_id, library_title, library_type), rating_keys in pending.items():
+            library = Library(id=library_id, title=library_title, type=library_type)
+            media = []
+            complete = True
+            for rating_key in sorted(rating_keys):
+                try:
+                    # Metadata is fetched with the owner's token, so only items the owner has watched pass
+                    media.extend(filter_watched(parse_library_content(self.plex.get_metadata(rating_key)), None, set()))
+                except Exception as e:
+                    logger.error(f"Failed to get metadata for rating key {rating_key} in {library_title}: {e}")
+                    complete = False
+            logger.info(f"Processing {len(media)} scrobbled items in {library_title}")
+            watched_media[library_title] = WatchedMedia(library=library, watched=media, complete=complete)
+
+        if watched_media:
+            try:
+                self.process(watched_media)
+            except Exception as e:
+                logger.exception(f"Failed to process scrobbled items: {e}")
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+
+class WebhookServer:
+    """
+    Listens for Plex webhooks and queues `media.scrobble` events from enabled libraries.
+
+    Plex webhooks aren't authenticated, so only events from the configured server (`Server.uuid`) and
+    accounts (`Account.id`) are accepted.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        enabled_libraries: list[str],
+        batcher: ScrobbleBatcher,
+        server_uuid: str,
+        account_ids: list[int] | None = None,
+    ):
+        self.enabled_libraries = enabled_libraries
+        self.batcher = batcher
+        self.server_uuid = server_uuid
+        self.account_ids = {int(account_id) for account_id in (account_ids or [OWNER_ACCOUNT_ID])}
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread: threading.Thread | None = None
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        webhook_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    payload = parse_webhook_payload(self.headers.get("Content-Type", ""), body)
+                except Exception as e:
+                    logger.warning(f"Ignoring malformed webhook: {e}")
+                    payload = None
+
+                if payload:
+                    webhook_server.handle_event(payload)
+
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def handle_event(self, payload: dict) -> None:
+        if payload.get("event") != SCROBBLE_EVENT:
+            return
+
+        server_uuid = (payload.get("Server") or {}).get("uuid")
+        if server_uuid != self.server_uuid:
+            logger.warning(f"Ignoring scrobble from unknown server: {server_uuid}")
+            return
+        account_id = (payload.get("Account") or {}).get("id")
+        if account_id not in self.account_ids:
+            logger.debug(f"Ignoring scrobble from account: {account_id}")
+            return
+
+        metadata = payload.get("Metadata", {})
+        library_title = metadata.get("librarySectionTitle", "")
+        if library_title not in self.enabled_libraries:
+            logger.debug(f"Ignoring scrobble from library: {library_title}")
+            return
+
+        library = Library(
+            id=str(metadata.get("librarySectionID", "")),
+            title=library_title,
+            type=metadata.get("librarySectionType", ""),
+        )
+        logger.debug(f"Queued scrobble: {metadata.get('grandparentTitle', '')} {metadata.get('title', '')}")
+        self.batcher.add(library, str(metadata.get("ratingKey", "")))
+
+    def start(self) -> None:
+        host, port = self.server.server_address[:2]
+        logger.info(f"Listening for Plex webhooks on {host}:{port}")
+        self._thread = threading.Thread(target=self.server.serve_forever, name="webhook-server", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop listening and process anything still waiting for the debounce window"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.batcher.cancel()
+        self.batcher.flush()
@@ -8,6 +8,12 @@ cp config.example.yaml ./config/config.example.yaml
 
 # Set default schedule if not provided
 SCHEDULE=${SCHEDULE:-3600}
+export SCHEDULE
+
+# Daemon mode keeps clients and caches alive between runs and schedules itself
+if [ "$PU_DAEMON" = "true" ]; then
+    exec python3 -m plex_unmonitorr.daemon
+fi
 
 while true; do
     python3 -m plex_unmonitorr.main